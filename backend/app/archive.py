@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, insert, update, delete, literal
+from sqlalchemy.orm import Session
+from app.cache import get_post_cache
+from app.config import get_settings
+from app.loaders import post_counter_columns
+from app.models.post import Post
+from app.models.message import Message
+from app.models.interaction import Comment, Like, GotIt, HiddenPost, Notification
+from app.models.archive import ArchivedPost, ArchivedComment, ArchivedLike, ArchivedGotIt
+
+ARCHIVE_BATCH_SIZE = 200
+
+_POST_COLUMNS = [
+    "id", "title", "description", "category", "latitude", "longitude", "address", "city", "state",
+    "photo_url", "owner_id", "created_at", "updated_at", "is_gone", "expires_at",
+]
+
+
+def _archive_batch(db: Session, post_ids, now: datetime):
+    """Move one batch of posts and their interaction rows to the archive tables in one transaction."""
+    likes_count, comments_count, got_it_count = post_counter_columns()
+
+    db.execute(insert(ArchivedPost).from_select(
+        _POST_COLUMNS + ["likes_count", "comments_count", "got_it_count", "archived_at"],
+        select(*(getattr(Post, name) for name in _POST_COLUMNS), likes_count, comments_count, got_it_count, literal(now))
+        .where(Post.id.in_(post_ids))
+    ))
+    db.execute(insert(ArchivedComment).from_select(
+        ["id", "content", "post_id", "user_id", "created_at"],
+        select(Comment.id, Comment.content, Comment.post_id, Comment.user_id, Comment.created_at).where(Comment.post_id.in_(post_ids))
+    ))
+    db.execute(insert(ArchivedLike).from_select(
+        ["id", "post_id", "user_id", "created_at"],
+        select(Like.id, Like.post_id, Like.user_id, Like.created_at).where(Like.post_id.in_(post_ids))
+    ))
+    db.execute(insert(ArchivedGotIt).from_select(
+        ["id", "post_id", "user_id", "giver_id", "created_at"],
+        select(GotIt.id, GotIt.post_id, GotIt.user_id, GotIt.giver_id, GotIt.created_at).where(GotIt.post_id.in_(post_ids))
+    ))
+
+    # GotIt rows stay behind so received/gave counts in user stats don't change
+    db.execute(update(GotIt).where(GotIt.post_id.in_(post_ids)).values(post_id=None))
+    db.execute(update(Message).where(Message.post_id.in_(post_ids)).values(post_id=None))
+    for model in (Notification, HiddenPost, Comment, Like):
+        db.execute(delete(model).where(model.post_id.in_(post_ids)))
+    db.execute(delete(Post).where(Post.id.in_(post_ids)))
+    db.commit()
+
+
+def archive_posts(db: Session, older_than: Optional[datetime] = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive posts that have been gone since before older_than. Returns how many were moved."""
+    now = datetime.utcnow()
+    if older_than is None:
+        older_than = now - timedelta(days=get_settings().ARCHIVE_AFTER_DAYS)
+    total = 0
+    while True:
+        post_ids = [row[0] for row in db.query(Post.id).filter(
+            Post.is_gone == True,
+            Post.updated_at < older_than
+        ).order_by(Post.id).limit(batch_size).all()]
+        if not post_ids:
+            break
+        _archive_batch(db, post_ids, now)
+        post_cache = get_post_cache()
+        for post_id in post_ids:
+            post_cache.invalidate(post_id)
+        total += len(post_ids)
+        if len(post_ids) < batch_size:
+            break
+    return total
+
+
+def get_archived_post(db: Session, post_id: int):
+    return db.query(ArchivedPost).filter(ArchivedPost.id == post_id).first()
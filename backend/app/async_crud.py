@@ -0,0 +1,75 @@
+"""Async versions of the crud functions behind the async route handlers.
+
+Objects returned here are fully loaded for their response schemas (owner,
+counters and user stats are primed), because lazy loading is not possible
+on an AsyncSession. Field handling is shared with app.crud.
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from app import crud, schemas, clusters
+from app.cache import get_post_cache
+from app.loaders import user_stats_columns, post_counter_columns
+from app.models.post import Post
+from app.models.user import User
+
+
+async def prime_user_stats(db: AsyncSession, users):
+    users = [user for user in users if user is not None]
+    if not users:
+        return users
+    rows = (await db.execute(
+        select(User.id, *user_stats_columns()).where(User.id.in_({user.id for user in users}))
+    )).all()
+    stats = {user_id: {"posts": posts, "got_it": got_it, "gave": gave} for user_id, posts, got_it, gave in rows}
+    for user in users:
+        user.prime_stats(stats[user.id])
+    return users
+
+
+async def get_post(db: AsyncSession, post_id: int):
+    likes_count, comments_count, got_it_count = post_counter_columns()
+    row = (await db.execute(
+        select(Post, likes_count, comments_count, got_it_count)
+        .options(joinedload(Post.owner))
+        .where(Post.id == post_id)
+        .execution_options(populate_existing=True)
+    )).first()
+    if row is None:
+        return None
+    post, likes, comments, got_it = row
+    post.prime_counters(likes, comments, got_it)
+    await prime_user_stats(db, [post.owner])
+    return post
+
+
+async def create_post(db: AsyncSession, post: schemas.PostCreate, user_id: int):
+    db_post = crud.build_post(post, user_id)
+    db.add(db_post)
+    await db.commit()
+    clusters.invalidate_location(db_post.latitude, db_post.longitude)
+    return await get_post(db, db_post.id)
+
+
+async def update_post(db: AsyncSession, post_id: int, post: schemas.PostUpdate):
+    db_post = await db.get(Post, post_id)
+    update_data, old_location = crud.apply_post_update(db_post, post)
+    await db.commit()
+    get_post_cache().invalidate(post_id)
+    crud.invalidate_post_clusters(db_post, update_data, old_location)
+    return await get_post(db, post_id)
+
+
+async def get_user(db: AsyncSession, user_id: int):
+    user = await db.get(User, user_id)
+    await prime_user_stats(db, [user])
+    return user
+
+
+async def update_user(db: AsyncSession, user_id: int, update_data: dict):
+    db_user = await db.get(User, user_id)
+    for key, value in update_data.items():
+        setattr(db_user, key, value)
+    await db.commit()
+    await prime_user_stats(db, [db_user])
+    return db_user
@@ -0,0 +1,303 @@
+"""Bulk import of users, posts, follows and interactions from CSV or NDJSON.
+
+Rows are inserted with batched executemany statements on a Core connection,
+without building ORM objects, one transaction per batch. Columns the app
+normally derives are filled in on the way: password hashes (bcrypt, spread
+over worker processes), post city/state and expiry, and the giver of a
+got-it. References may use ids or usernames (``owner_username``,
+``follower_username``, ...). Follows, likes and got-its that already exist
+are skipped. No notifications are created for imported interactions.
+
+The target database must be migrated to the latest alembic revision
+(``check_schema``). After an import, ``finalize`` moves Postgres id sequences
+past imported ids, refreshes planner statistics and clears the cache. With
+the default in-process cache that only clears the importing process's own
+cache; running servers keep serving their cached posts, feeds and clusters
+until those expire. Use CACHE_BACKEND=redis to clear them too.
+"""
+import csv
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert, inspect, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from app.cache import get_cache
+from app.models.user import User
+from app.models.post import Post, PostCategory, parse_city_state, compute_expires_at
+from app.models.follow import Follow
+from app.models.interaction import Like, Comment, GotIt
+
+BATCH_SIZE = 5000
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+# Import order for a whole dataset directory; later files reference earlier ones
+IMPORT_ORDER = ["users", "posts", "follows", "likes", "comments", "got_it"]
+SEQUENCE_TABLES = ["users", "posts", "follows", "likes", "comments", "got_it"]
+CATEGORIES = {category.value for category in PostCategory}
+
+
+def read_records(path: str, format: str = None):
+    """Yield dicts from a .csv or .ndjson/.jsonl file (optionally .gz). Empty CSV fields become None."""
+    name = path[:-3] if path.endswith(".gz") else path
+    if format is None:
+        format = "csv" if name.endswith(".csv") else "ndjson"
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="" if format == "csv" else None, encoding="utf-8") as f:
+        if format == "csv":
+            for row in csv.DictReader(f):
+                yield {key: (value if value != "" else None) for key, value in row.items()}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _batches(records, size: int):
+    records = iter(records)
+    while batch := list(islice(records, size)):
+        yield batch
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def _datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Stored as naive UTC like the rest of the app
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def _hash_password(password: str) -> str:
+    from app.utils import get_password_hash
+    return get_password_hash(password)
+
+
+class Importer:
+    """Imports records into one database. Each import_* method returns the number of rows read."""
+
+    def __init__(self, engine, batch_size: int = BATCH_SIZE, hash_workers: int = None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.hash_workers = hash_workers or os.cpu_count() or 1
+        self.now = datetime.utcnow()
+        self._user_ids = {}
+        self._post_owners = {}
+
+    def _insert(self, conn, model, rows, ignore_conflicts: bool = False):
+        if not rows:
+            return
+        dialect = self.engine.dialect.name
+        if ignore_conflicts and dialect == "postgresql":
+            stmt = postgresql.insert(model).on_conflict_do_nothing()
+        elif ignore_conflicts and dialect == "sqlite":
+            stmt = sqlite.insert(model).on_conflict_do_nothing()
+        else:
+            stmt = insert(model)
+        conn.execute(stmt, rows)
+
+    def _resolve_users(self, conn, batch, *fields):
+        """Map the usernames in batch's ``{field}_username`` columns to user ids."""
+        missing = {
+            record[f"{field}_username"] for record in batch for field in fields
+            if record.get(f"{field}_id") is None and record.get(f"{field}_username") is not None
+        } - self._user_ids.keys()
+        if missing:
+            rows = conn.execute(select(User.username, User.id).where(User.username.in_(missing)))
+            self._user_ids.update(dict(rows.all()))
+
+    def _user_id(self, record, field: str, line: int):
+        if record.get(f"{field}_id") is not None:
+            return int(record[f"{field}_id"])
+        username = record.get(f"{field}_username")
+        if username not in self._user_ids:
+            raise ValueError(f"Record {line}: unknown or missing {field} ({field}_id or {field}_username)")
+        return self._user_ids[username]
+
+    def _run(self, records, model, build, user_fields=(), ignore_conflicts: bool = False):
+        count = 0
+        for batch in _batches(records, self.batch_size):
+            with self.engine.begin() as conn:
+                self._resolve_users(conn, batch, *user_fields)
+                rows = build(conn, batch, count)
+                # executemany needs the same keys in every row
+                if len({frozenset(row) for row in rows}) > 1:
+                    raise ValueError(f"Either every {model.__tablename__} record or none must have an id")
+                self._insert(conn, model, rows, ignore_conflicts)
+            count += len(batch)
+        return count
+
+    def import_users(self, records):
+        with ProcessPoolExecutor(self.hash_workers) as pool:
+            def build(conn, batch, offset):
+                plain = [i for i, record in enumerate(batch) if not record.get("hashed_password")]
+                for i in plain:
+                    if not batch[i].get("password"):
+                        raise ValueError(f"Record {offset + i + 1}: needs password or hashed_password")
+                hashes = dict(zip(plain, pool.map(_hash_password, [batch[i]["password"] for i in plain], chunksize=16)))
+                rows = []
+                for i, record in enumerate(batch):
+                    row = {
+                        "username": record["username"],
+                        "email": record["email"],
+                        "hashed_password": record.get("hashed_password") or hashes[i],
+                        "display_name": record.get("display_name"),
+                        "bio": record.get("bio"),
+                        "profile_picture_url": record.get("profile_picture_url"),
+                        "latitude": _float(record.get("latitude")),
+                        "longitude": _float(record.get("longitude")),
+                    }
+                    if record.get("id") is not None:
+                        row["id"] = int(record["id"])
+                    rows.append(row)
+                return rows
+
+            return self._run(records, User, build)
+
+    def import_posts(self, records):
+        def build(conn, batch, offset):
+            rows = []
+            for i, record in enumerate(batch):
+                line = offset + i + 1
+                if record.get("category") not in CATEGORIES:
+                    raise ValueError(f"Record {line}: invalid category {record.get('category')!r}")
+                created_at = _datetime(record.get("created_at")) or self.now
+                city, state = parse_city_state(record.get("address"))
+                row = {
+                    "title": record["title"],
+                    "description": record.get("description"),
+                    "category": record["category"],
+                    "latitude": float(record["latitude"]),
+                    "longitude": float(record["longitude"]),
+                    "address": record.get("address"),
+                    "city": record.get("city") or city,
+                    "state": record.get("state") or state,
+                    "photo_url": record.get("photo_url") or "",
+                    "owner_id": self._user_id(record, "owner", line),
+                    "created_at": created_at,
+                    "updated_at": _datetime(record.get("updated_at")) or created_at,
+                    "is_gone": _bool(record.get("is_gone", False)),
+                    "expires_at": _datetime(record.get("expires_at")) or compute_expires_at(record["category"], created_at),
+                }
+                if record.get("id") is not None:
+                    row["id"] = int(record["id"])
+                rows.append(row)
+            return rows
+
+        return self._run(records, Post, build, user_fields=("owner",))
+
+    def import_follows(self, records):
+        def build(conn, batch, offset):
+            rows = []
+            for i, record in enumerate(batch):
+                follower = self._user_id(record, "follower", offset + i + 1)
+                following = self._user_id(record, "following", offset + i + 1)
+                if follower != following:
+                    rows.append({
+                        "follower_id": follower,
+                        "following_id": following,
+                        "created_at": _datetime(record.get("created_at")) or self.now,
+                    })
+            return rows
+
+        return self._run(records, Follow, build, user_fields=("follower", "following"), ignore_conflicts=True)
+
+    def import_likes(self, records):
+        def build(conn, batch, offset):
+            return [{
+                "post_id": int(record["post_id"]),
+                "user_id": self._user_id(record, "user", offset + i + 1),
+                "created_at": _datetime(record.get("created_at")) or self.now,
+            } for i, record in enumerate(batch)]
+
+        return self._run(records, Like, build, user_fields=("user",), ignore_conflicts=True)
+
+    def import_comments(self, records):
+        def build(conn, batch, offset):
+            return [{
+                "post_id": int(record["post_id"]),
+                "user_id": self._user_id(record, "user", offset + i + 1),
+                "content": record["content"],
+                "created_at": _datetime(record.get("created_at")) or self.now,
+            } for i, record in enumerate(batch)]
+
+        return self._run(records, Comment, build, user_fields=("user",))
+
+    def import_got_it(self, records):
+        def build(conn, batch, offset):
+            post_ids = {int(record["post_id"]) for record in batch} - self._post_owners.keys()
+            if post_ids:
+                self._post_owners.update(dict(conn.execute(select(Post.id, Post.owner_id).where(Post.id.in_(post_ids))).all()))
+            rows = []
+            for i, record in enumerate(batch):
+                post_id = int(record["post_id"])
+                if post_id not in self._post_owners:
+                    raise ValueError(f"Record {offset + i + 1}: unknown post {post_id}")
+                rows.append({
+                    "post_id": post_id,
+                    "user_id": self._user_id(record, "user", offset + i + 1),
+                    # The giver is always the post owner
+                    "giver_id": self._post_owners[post_id],
+                    "created_at": _datetime(record.get("created_at")) or self.now,
+                })
+            return rows
+
+        return self._run(records, GotIt, build, user_fields=("user",), ignore_conflicts=True)
+
+    def import_file(self, kind: str, path: str, format: str = None):
+        return getattr(self, f"import_{kind}")(read_records(path, format))
+
+    def finalize(self):
+        reset_sequences(self.engine)
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+        get_cache().clear()
+
+
+def check_schema(engine):
+    """Raise ValueError unless the database already has the current schema.
+
+    The importer never creates tables. Databases under alembic must be at the
+    latest revision. Databases without alembic_version were created from the
+    models on API startup, and only need the tables the importer writes to.
+    """
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    missing = set(SEQUENCE_TABLES) - set(inspect(engine).get_table_names())
+    if missing:
+        raise ValueError(f"missing tables {', '.join(sorted(missing))}; start the API once or run `alembic upgrade head` first")
+    with engine.connect() as conn:
+        current = set(MigrationContext.configure(conn).get_current_heads())
+    if not current:
+        return
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+    if current != heads:
+        raise ValueError(f"database is at revision {', '.join(sorted(current))}, not {', '.join(sorted(heads))}; run `alembic upgrade head` first")
+
+
+def reset_sequences(engine):
+    """Move Postgres id sequences past explicitly inserted ids; a no-op elsewhere."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for table in SEQUENCE_TABLES:
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+            ))
@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from app.config import get_settings
+
+
+class LocalCache:
+    """In-process LRU cache with per-entry TTL. Values are stored as-is.
+
+    Counters (incr/counter) are kept in their own LRU, also bounded by
+    max_entries. An evicted counter reads as the highest value evicted so far
+    and counts up from there, so version numbers built on counters never fall
+    back to an old value.
+    """
+
+    def __init__(self, max_entries: int = 10000, default_ttl: float = 60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._counters = OrderedDict()
+        self._counter_floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters.get(key, self._counter_floor) + 1
+            self._counters[key] = value
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_entries:
+                _, evicted = self._counters.popitem(last=False)
+                self._counter_floor = max(self._counter_floor, evicted)
+            return value
+
+    def counter(self, key) -> int:
+        with self._lock:
+            value = self._counters.get(key)
+            if value is None:
+                return self._counter_floor
+            self._counters.move_to_end(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+            self._counter_floor = 0
+
+
+class RedisCache:
+    """Redis-backed cache shared by all workers. Values are stored as JSON."""
+
+    def __init__(self, url: str, default_ttl: float = 60, prefix: str = "freebies:"):
+        import redis  # optional dependency, only needed for this backend
+        self._client = redis.Redis.from_url(url)
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._client.set(self.prefix + key, json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self._client.incr(self.prefix + key)
+
+    def counter(self, key) -> int:
+        return int(self._client.get(self.prefix + key) or 0)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(key)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution."""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class PostCache:
+    """Read-through cache of serialized post payloads.
+
+    Entries are keyed by post id and a per-post version; invalidate() bumps the
+    version so every worker sharing the backend stops serving the old payload.
+    Misses for the same post are coalesced so only one request hits the database.
+    """
+
+    def __init__(self, backend, ttl: float = 60):
+        self.backend = backend
+        self.ttl = ttl
+        self._flight = SingleFlight()
+
+    def _version(self, post_id: int) -> int:
+        return self.backend.counter(f"post:{post_id}:version")
+
+    def get_or_load(self, post_id: int, load):
+        key = f"post:{post_id}:v{self._version(post_id)}"
+        payload = self.backend.get(key)
+        if payload is not None:
+            return payload
+
+        def fill():
+            cached = self.backend.get(key)
+            if cached is not None:
+                return cached
+            loaded = load()
+            if loaded is not None:
+                self.backend.set(key, loaded, ttl=self.ttl)
+            return loaded
+
+        return self._flight.do(key, fill)
+
+    def invalidate(self, post_id: int):
+        version = self.backend.incr(f"post:{post_id}:version")
+        self.backend.delete(f"post:{post_id}:v{version - 1}")
+
+
+@lru_cache()
+def get_cache():
+    settings = get_settings()
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCache(settings.CACHE_REDIS_URL)
+    return LocalCache(max_entries=settings.CACHE_MAX_ENTRIES)
+
+
+@lru_cache()
+def get_post_cache():
+    return PostCache(get_cache(), ttl=get_settings().POST_CACHE_TTL_SECONDS)
+
+
+def get_feed_version(user_id: int) -> int:
+    """Per-user version embedded in cached feed rankings."""
+    return get_cache().counter(f"feed:{user_id}:version")
+
+
+def invalidate_feed(user_id: int):
+    """Drop every cached ranked feed for a user, e.g. after they hide a post."""
+    get_cache().incr(f"feed:{user_id}:version")
@@ -0,0 +1,112 @@
+import numpy as np
+from sqlalchemy.orm import Session
+from app import geo
+from app.cache import get_cache
+from app.models.post import Post, PostCategory
+
+MAX_ZOOM = 20
+CELLS_PER_TILE = 4  # 256px map tiles split into 64px cells
+MAX_CELLS = 4096
+CLUSTER_CACHE_TTL_SECONDS = 300
+
+CATEGORIES = [category.value for category in PostCategory]
+_CATEGORY_INDEX = {value: i for i, value in enumerate(CATEGORIES)}
+
+
+def cell_size(zoom: int) -> float:
+    """Width of a grid cell in degrees at the given zoom level."""
+    return 360.0 / (2 ** zoom * CELLS_PER_TILE)
+
+
+def cell_of(latitude: float, longitude: float, zoom: int):
+    return geo.grid_cell(latitude, longitude, cell_size(zoom))
+
+
+def _cache_key(zoom: int, cell_x: int, cell_y: int) -> str:
+    return f"clusters:{zoom}:{cell_x}:{cell_y}"
+
+
+def invalidate_location(latitude: float, longitude: float):
+    """Drop the cached cell containing this point at every zoom level."""
+    if latitude is None or longitude is None:
+        return
+    cache = get_cache()
+    for zoom in range(MAX_ZOOM + 1):
+        cache.delete(_cache_key(zoom, *cell_of(latitude, longitude, zoom)))
+
+
+def _aggregate(db: Session, zoom: int, x0: int, x1: int, y0: int, y1: int):
+    """Bin active posts in cells [x0, x1] x [y0, y1] and return {(x, y): cell}."""
+    size = cell_size(zoom)
+    rows = db.query(Post.id, Post.latitude, Post.longitude, Post.category).filter(
+        Post.is_gone == False,
+        Post.latitude >= y0 * size - 90, Post.latitude < (y1 + 1) * size - 90,
+        Post.longitude >= x0 * size - 180, Post.longitude < (x1 + 1) * size - 180
+    ).all()
+
+    width, height = x1 - x0 + 1, y1 - y0 + 1
+    n_cells, n_categories = width * height, len(CATEGORIES)
+    cells = {(x, y): None for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)}
+    if not rows:
+        return cells
+
+    ids, lats, lngs, categories = zip(*rows)
+    ids = np.asarray(ids, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    category_codes = np.asarray([_CATEGORY_INDEX.get(c, 0) for c in categories], dtype=np.int64)
+
+    cell_x = np.clip(np.floor((lngs + 180) / size).astype(np.int64) - x0, 0, width - 1)
+    cell_y = np.clip(np.floor((lats + 90) / size).astype(np.int64) - y0, 0, height - 1)
+    flat = cell_x * height + cell_y
+
+    counts = np.bincount(flat, minlength=n_cells)
+    lat_sums = np.bincount(flat, weights=lats, minlength=n_cells)
+    lng_sums = np.bincount(flat, weights=lngs, minlength=n_cells)
+    # For single-post cells the id "sum" is the post id itself
+    id_sums = np.bincount(flat, weights=ids, minlength=n_cells)
+    by_category = np.bincount(flat * n_categories + category_codes, minlength=n_cells * n_categories).reshape(n_cells, n_categories)
+
+    for i in np.flatnonzero(counts):
+        count = int(counts[i])
+        x, y = divmod(int(i), height)
+        cells[(x0 + x, y0 + y)] = {
+            "cell_x": x0 + x,
+            "cell_y": y0 + y,
+            "count": count,
+            "latitude": float(lat_sums[i] / count),
+            "longitude": float(lng_sums[i] / count),
+            "categories": {CATEGORIES[j]: int(c) for j, c in enumerate(by_category[i]) if c},
+            "post_id": int(id_sums[i]) if count == 1 else None,
+        }
+    return cells
+
+
+def get_clusters(db: Session, zoom: int, min_lat: float, min_lng: float, max_lat: float, max_lng: float):
+    """Return non-empty grid cells covering the bounding box, using cached cells where possible."""
+    x0, y0 = cell_of(min_lat, min_lng, zoom)
+    x1, y1 = cell_of(max_lat, max_lng, zoom)
+    if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_CELLS:
+        raise ValueError("Bounding box covers too many cells for this zoom level")
+
+    cache = get_cache()
+    cells, missing = {}, []
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            cached = cache.get(_cache_key(zoom, x, y))
+            if cached is None:
+                missing.append((x, y))
+            elif cached:
+                cells[(x, y)] = cached
+
+    if missing:
+        # One query over the smallest cell range covering every miss
+        mx0, mx1 = min(x for x, _ in missing), max(x for x, _ in missing)
+        my0, my1 = min(y for _, y in missing), max(y for _, y in missing)
+        for (x, y), cell in _aggregate(db, zoom, mx0, mx1, my0, my1).items():
+            # Empty cells are cached as {} so they are not re-queried
+            cache.set(_cache_key(zoom, x, y), cell or {}, ttl=CLUSTER_CACHE_TTL_SECONDS)
+            if cell and x0 <= x <= x1 and y0 <= y <= y1:
+                cells[(x, y)] = cell
+
+    return [cells[key] for key in sorted(cells)]
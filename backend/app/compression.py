@@ -0,0 +1,54 @@
+"""Gzip compression of JSON responses.
+
+Starlette's GZipMiddleware compresses every response body over its minimum
+size. That includes photos under /uploads and exports that are gzip files
+already. JSONGZipMiddleware compresses only COMPRESSIBLE_TYPES, and only
+when the client accepts gzip. Other responses pass through untouched.
+
+It runs the app under a plain GZipMiddleware and relies on its documented
+behaviour of leaving responses that already have a Content-Encoding alone.
+Responses of other types get a ``Content-Encoding: identity`` marker on the
+way in, which is removed again before the response leaves.
+"""
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+
+COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson"}
+
+_PASSTHROUGH = (b"content-encoding", b"identity")
+
+
+def _compressible(headers: Headers) -> bool:
+    return headers.get("content-type", "").partition(";")[0].strip() in COMPRESSIBLE_TYPES
+
+
+class JSONGZipMiddleware:
+    def __init__(self, app, minimum_size: int = 500, compresslevel: int = 9):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "gzip" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.app(scope, receive, send)
+            return
+        marked = False
+
+        async def app(scope, receive, gzip_send):
+            async def send_marked(message):
+                nonlocal marked
+                if message["type"] == "http.response.start":
+                    headers = Headers(raw=message["headers"])
+                    if "content-encoding" not in headers and not _compressible(headers):
+                        marked = True
+                        message = {**message, "headers": [*message["headers"], _PASSTHROUGH]}
+                await gzip_send(message)
+
+            await self.app(scope, receive, send_marked)
+
+        async def send_unmarked(message):
+            if marked and message["type"] == "http.response.start":
+                message = {**message, "headers": [header for header in message["headers"] if header != _PASSTHROUGH]}
+            await send(message)
+
+        await GZipMiddleware(app, self.minimum_size, self.compresslevel)(scope, receive, send_unmarked)
@@ -10,6 +10,78 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    # Comma-separated usernames allowed to use admin endpoints such as exports
+    ADMIN_USERNAMES: str = os.getenv("ADMIN_USERNAMES", "")
+    # Connection pool settings (ignored for SQLite)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # Postgres only; 0 disables
+    # SQLite production profile: WAL, relaxed fsync, mmap and periodic optimize
+    SQLITE_TUNED: bool = os.getenv("SQLITE_TUNED", "false").lower() == "true"
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_MAINTENANCE_INTERVAL_SECONDS: int = int(os.getenv("SQLITE_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+    # Comma-separated read replica URLs; empty sends every query to DATABASE_URL
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
+    REPLICA_STICKY_SECONDS: int = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+    REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+    REPLICA_LAG_CHECK_SECONDS: int = int(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+    REPLICA_RETRY_SECONDS: int = int(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+    # Per-route request metrics at /metrics, and Server-Timing response headers
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+    # Statements at or over SLOW_QUERY_MS are logged with their plan; 0 disables
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "200"))
+    SLOW_QUERY_EXPLAIN: bool = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+    SLOW_QUERY_LOG: str = os.getenv("SLOW_QUERY_LOG", "logs/slow_queries.log")
+    SLOW_QUERY_LOG_MAX_BYTES: int = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    SLOW_QUERY_LOG_BACKUPS: int = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+    # Logging; see app/log.py. LOG_SAMPLE_RATES and LOG_LEVELS are "logger=value,..." lists
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "")
+    LOG_RATE_LIMIT_PER_SECOND: float = float(os.getenv("LOG_RATE_LIMIT_PER_SECOND", "50"))
+    # Routes that opt in encode responses with app/serialization.py instead of FastAPI's response_model path
+    FAST_SERIALIZATION: bool = os.getenv("FAST_SERIALIZATION", "true").lower() == "true"
+    # JSON responses of at least COMPRESSION_MIN_BYTES are gzipped; 0 disables
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+    COMPRESSION_LEVEL: int = int(os.getenv("COMPRESSION_LEVEL", "6"))
+    # Request profiling: admins send X-Profile; PROFILE_EVERY_N > 0 also profiles 1 in N requests
+    PROFILE_EVERY_N: int = int(os.getenv("PROFILE_EVERY_N", "0"))
+    PROFILE_MODE: str = os.getenv("PROFILE_MODE", "sample")
+    PROFILE_SAMPLE_INTERVAL_MS: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "local")  # "local" or "redis"
+    CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    POST_CACHE_TTL_SECONDS: int = int(os.getenv("POST_CACHE_TTL_SECONDS", "60"))
+    FEED_RANKING_TTL_SECONDS: int = int(os.getenv("FEED_RANKING_TTL_SECONDS", "30"))
+    # "category=hours" pairs; categories not listed never expire
+    POST_TTL_HOURS: str = os.getenv("POST_TTL_HOURS", "leftovers=12,restaurant=24,home_made=48")
+    ENABLE_BACKGROUND_JOBS: bool = os.getenv("ENABLE_BACKGROUND_JOBS", "false").lower() == "true"
+    EXPIRY_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("EXPIRY_SWEEP_INTERVAL_SECONDS", "300"))
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "7"))
+    ARCHIVE_INTERVAL_SECONDS: int = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+    @property
+    def admin_usernames(self):
+        return {name.strip() for name in self.ADMIN_USERNAMES.split(",") if name.strip()}
+
+    @property
+    def replica_urls(self):
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+
+    @property
+    def post_ttl_hours(self):
+        ttls = {}
+        for pair in filter(None, (p.strip() for p in self.POST_TTL_HOURS.split(","))):
+            category, hours = pair.split("=")
+            ttls[category.strip()] = float(hours)
+        return ttls
 
     class Config:
         env_file = ".env"
@@ -1,12 +1,16 @@
-from sqlalchemy.orm import Session, joinedload, subqueryload
-from sqlalchemy import func, desc, and_, or_
-from app import models, schemas, utils
+from sqlalchemy.orm import Session, joinedload, subqueryload, selectinload
+from sqlalchemy import func, desc, and_, or_, case, delete, insert, select, literal, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app import models, schemas, utils, geo, clusters
 from typing import List, Optional
 from datetime import datetime
 import math
-from app.models.post import PostCategory
+from app.models.post import PostCategory, parse_city_state, compute_expires_at
 from app.models.message import MessageType
-from app.models.interaction import Notification, NotificationType, HiddenPost
+from app.models.interaction import Notification, NotificationType, HiddenPost, SyncAction, SyncReceipt, AreaSubscription, SubscriptionCell
+from app.cache import get_post_cache, invalidate_feed
+from app.loaders import post_counter_columns
 from fastapi import HTTPException
 
 # Haversine distance function
@@ -21,6 +25,38 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     distance = R * c
     return distance
 
+# Upsert helpers
+def _insert_ignore(db: Session, model, **values):
+    """INSERT ... ON CONFLICT DO NOTHING. Returns the new row id, or None if the row already existed."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(model)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(model)
+    else:
+        # No ON CONFLICT support; fall back to a savepoint around a plain insert
+        try:
+            with db.begin_nested():
+                return db.execute(insert(model).values(**values)).inserted_primary_key[0]
+        except IntegrityError:
+            return None
+    stmt = stmt.values(**values).on_conflict_do_nothing().returning(model.id)
+    return db.execute(stmt).scalar()
+
+def _delete_returning(db: Session, model, *criteria):
+    """DELETE ... RETURNING id. Returns the deleted row id, or None if nothing matched."""
+    stmt = delete(model).where(*criteria).returning(model.id)
+    return db.execute(stmt, execution_options={"synchronize_session": False}).scalar()
+
+def _commit_post_change(db: Session, post_id: int, commit: bool = True):
+    """Commit a change to a post (or its interactions) and drop its cached payload."""
+    if commit:
+        db.commit()
+        get_post_cache().invalidate(post_id)
+
+def _actor_name(actor):
+    return actor.display_name or actor.username
+
 # User operations
 def get_user(db: Session, user_id: int):
     return db.query(models.user.User).options(
@@ -29,6 +65,9 @@ def get_user(db: Session, user_id: int):
         joinedload(models.user.User.following),
     ).filter(models.user.User.id == user_id).first()
 
+def user_exists(db: Session, user_id: int) -> bool:
+    return db.query(db.query(models.user.User.id).filter(models.user.User.id == user_id).exists()).scalar()
+
 def get_user_by_username(db: Session, username: str):
     return db.query(models.user.User).filter(models.user.User.username == username).first()
 
@@ -65,30 +104,66 @@ def get_post(db: Session, post_id: int):
 def get_user_posts(db: Session, user_id: int, skip: int = 0, limit: int = 20):
     return db.query(models.post.Post).filter(models.post.Post.owner_id == user_id).order_by(desc(models.post.Post.created_at)).offset(skip).limit(limit).all()
 
-def create_post(db: Session, post: schemas.PostCreate, user_id: int):
+def build_post(post: schemas.PostCreate, user_id: int):
     post_dict = post.dict()
     # Convert Enum to string if needed
     if hasattr(post_dict['category'], 'value'):
         post_dict['category'] = post_dict['category'].value
-    post_dict.pop('city', None)  # Remove city if present
-    db_post = models.post.Post(**post_dict, owner_id=user_id)
+    post_dict.pop('city', None)  # Derived from the address below
+    post_dict['city'], post_dict['state'] = parse_city_state(post_dict.get('address'))
+    created_at = datetime.utcnow()
+    return models.post.Post(
+        **post_dict,
+        owner_id=user_id,
+        created_at=created_at,
+        expires_at=compute_expires_at(post_dict['category'], created_at)
+    )
+
+def create_post(db: Session, post: schemas.PostCreate, user_id: int):
+    db_post = build_post(post, user_id)
     db.add(db_post)
     db.commit()
     db.refresh(db_post)
+    clusters.invalidate_location(db_post.latitude, db_post.longitude)
     return db_post
 
-def update_post(db: Session, post_id: int, post: schemas.PostUpdate):
-    db_post = get_post(db, post_id)
+def apply_post_update(db_post, post: schemas.PostUpdate):
+    """Set the fields from a PostUpdate (plus derived columns) on db_post; returns (update_data, old_location)."""
     update_data = post.dict(exclude_unset=True)
 
     # Convert category enum to its string value before updating
     if 'category' in update_data and hasattr(update_data['category'], 'value'):
         update_data['category'] = update_data['category'].value
 
+    # Keep the derived city/state columns in sync; an explicit city ("City" or "City, ST") wins,
+    # and a bare city keeps the current state
+    if update_data.get('city'):
+        update_data['city'], state = parse_city_state(update_data['city'])
+        if state:
+            update_data['state'] = state
+    elif 'address' in update_data:
+        update_data['city'], update_data['state'] = parse_city_state(update_data['address'])
+
+    if 'category' in update_data:
+        update_data['expires_at'] = compute_expires_at(update_data['category'], db_post.created_at or datetime.utcnow())
+
+    old_location = (db_post.latitude, db_post.longitude)
     for key, value in update_data.items():
         setattr(db_post, key, value)
-    db.commit()
+    return update_data, old_location
+
+def invalidate_post_clusters(db_post, update_data, old_location):
+    # Map clusters count active posts by location and category
+    if update_data.keys() & {'latitude', 'longitude', 'category', 'is_gone'}:
+        clusters.invalidate_location(*old_location)
+        clusters.invalidate_location(db_post.latitude, db_post.longitude)
+
+def update_post(db: Session, post_id: int, post: schemas.PostUpdate):
+    db_post = get_post(db, post_id)
+    update_data, old_location = apply_post_update(db_post, post)
+    _commit_post_change(db, post_id)
     db.refresh(db_post)
+    invalidate_post_clusters(db_post, update_data, old_location)
     return db_post
 
 def delete_post(db: Session, post_id: int):
@@ -96,8 +171,47 @@ def delete_post(db: Session, post_id: int):
     # Manually nullify the post_id in associated GotIt records
     for got_it_record in db_post.got_it:
         got_it_record.post_id = None
+    location = (db_post.latitude, db_post.longitude)
     db.delete(db_post)
-    db.commit()
+    _commit_post_change(db, post_id)
+    clusters.invalidate_location(*location)
+
+EXPIRY_BATCH_SIZE = 500
+
+def expire_posts(db: Session, now: Optional[datetime] = None, batch_size: int = EXPIRY_BATCH_SIZE) -> int:
+    """Mark active posts past their expires_at as gone, in batches. Returns how many were expired."""
+    Post = models.post.Post
+    now = now or datetime.utcnow()
+    total = 0
+    while True:
+        rows = db.query(Post.id, Post.latitude, Post.longitude).filter(
+            Post.is_gone == False,
+            Post.expires_at <= now
+        ).limit(batch_size).all()
+        if not rows:
+            break
+        db.query(Post).filter(Post.id.in_([row.id for row in rows])).update(
+            {Post.is_gone: True}, synchronize_session=False
+        )
+        db.commit()
+        post_cache = get_post_cache()
+        for post_id, latitude, longitude in rows:
+            post_cache.invalidate(post_id)
+            clusters.invalidate_location(latitude, longitude)
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+    return total
+
+def filter_by_city(query, city: str):
+    """Filter a Post query by "City" or "City, ST" using the indexed lower(city) column."""
+    name, state = city, None
+    if ',' in city:
+        name, state = (part.strip() for part in city.rsplit(',', 1))
+    query = query.filter(func.lower(models.post.Post.city) == name.strip().lower())
+    if state:
+        query = query.filter(models.post.Post.state == state.upper())
+    return query
 
 def get_feed(
     db: Session,
@@ -108,7 +222,9 @@ def get_feed(
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
     radius: Optional[float] = None,
-    following_only: bool = False
+    following_only: bool = False,
+    city: Optional[str] = None,
+    include_gone: bool = False
 ):
     # Get all post IDs that the user has hidden
     hidden_post_ids_query = db.query(models.interaction.HiddenPost.post_id).filter(
@@ -117,6 +233,10 @@ def get_feed(
     hidden_post_ids = {row[0] for row in hidden_post_ids_query.all()}
     
     query = db.query(models.post.Post)
+
+    # Active posts only unless asked otherwise (uses the partial active-post indexes)
+    if not include_gone:
+        query = query.filter(models.post.Post.is_gone == False)
     
     # Exclude hidden posts
     if hidden_post_ids:
@@ -130,6 +250,9 @@ def get_feed(
         category_value = category.value if hasattr(category, 'value') else category
         query = query.filter(models.post.Post.category == category_value)
     
+    if city:
+        query = filter_by_city(query, city)
+    
     if latitude and longitude and radius:
         # Haversine formula for distance calculation
         query = query.filter(
@@ -142,33 +265,78 @@ def get_feed(
     
     return query.order_by(desc(models.post.Post.created_at)).offset(skip).limit(limit).all()
 
-def hide_post(db: Session, user_id: int, post_id: int):
-    existing_hidden = db.query(models.interaction.HiddenPost).filter(
-        models.interaction.HiddenPost.user_id == user_id,
-        models.interaction.HiddenPost.post_id == post_id
-    ).first()
-
-    if existing_hidden:
-        return existing_hidden
+NEARBY_INITIAL_RADIUS_KM = 1
+NEARBY_MAX_RADIUS_KM = 100
 
-    db_hidden_post = models.interaction.HiddenPost(user_id=user_id, post_id=post_id)
-    db.add(db_hidden_post)
-    db.commit()
-    db.refresh(db_hidden_post)
-    return db_hidden_post
+def get_nearby_posts(
+    db: Session,
+    user_id: int,
+    latitude: float,
+    longitude: float,
+    k: int = 20,
+    category: Optional[PostCategory] = None,
+    after: Optional[tuple] = None,
+    max_radius: float = NEARBY_MAX_RADIUS_KM
+):
+    """Return up to k active posts closest to (latitude, longitude) as (post, distance_km) pairs.
+
+    Searches bounding boxes of doubling radius over the (latitude, longitude)
+    index until k posts are found inside the search circle, so only nearby
+    rows are ever scored. `after` is a (distance_km, post_id) cursor; only
+    posts strictly beyond it are returned.
+    """
+    Post = models.post.Post
+    hidden_post_ids = select(models.interaction.HiddenPost.post_id).where(
+        models.interaction.HiddenPost.user_id == user_id
+    )
+    base_query = db.query(Post.id, Post.latitude, Post.longitude).filter(
+        Post.is_gone == False,
+        Post.id.notin_(hidden_post_ids)
+    )
+    if category:
+        base_query = base_query.filter(Post.category == (category.value if hasattr(category, 'value') else category))
+
+    radius = NEARBY_INITIAL_RADIUS_KM
+    if after:
+        radius = max(radius, after[0] * 2)
+    while True:
+        radius = min(radius, max_radius)
+        min_lat, max_lat, lng_ranges = geo.bounding_box(latitude, longitude, radius)
+        rows = base_query.filter(
+            Post.latitude.between(min_lat, max_lat),
+            or_(*[Post.longitude.between(min_lng, max_lng) for min_lng, max_lng in lng_ranges])
+        ).all()
+        candidates = []
+        for post_id, post_lat, post_lng in rows:
+            key = (haversine_distance(latitude, longitude, post_lat, post_lng), post_id)
+            # Anything in the box but outside the circle may be beaten by a post outside the box
+            if key[0] <= radius and (after is None or key > tuple(after)):
+                candidates.append(key)
+        if len(candidates) >= k or radius >= max_radius:
+            break
+        radius *= 2
+
+    nearest = sorted(candidates)[:k]
+    posts = {post.id: post for post in db.query(Post).filter(Post.id.in_([post_id for _, post_id in nearest]))}
+    return [(posts[post_id], distance) for distance, post_id in nearest if post_id in posts]
+
+def hide_post(db: Session, user_id: int, post_id: int, commit: bool = True) -> bool:
+    _insert_ignore(db, models.interaction.HiddenPost, user_id=user_id, post_id=post_id)
+    if commit:
+        db.commit()
+    invalidate_feed(user_id)
+    return True
 
-def unhide_post(db: Session, user_id: int, post_id: int):
-    hidden_post = db.query(models.interaction.HiddenPost).filter(
+def unhide_post(db: Session, user_id: int, post_id: int, commit: bool = True) -> bool:
+    deleted = _delete_returning(
+        db, models.interaction.HiddenPost,
         models.interaction.HiddenPost.user_id == user_id,
         models.interaction.HiddenPost.post_id == post_id
-    ).first()
-
-    if not hidden_post:
-        return None
-
-    db.delete(hidden_post)
-    db.commit()
-    return {"message": "Post unhidden successfully"}
+    )
+    if commit:
+        db.commit()
+    invalidate_feed(user_id)
+    return deleted is not None
 
 def is_post_hidden(db: Session, user_id: int, post_id: int) -> bool:
     hidden_post = db.query(models.interaction.HiddenPost).filter(
@@ -177,65 +345,121 @@ def is_post_hidden(db: Session, user_id: int, post_id: int) -> bool:
     ).first()
     return hidden_post is not None
 
+def get_hidden_post_ids(db: Session, user_id: int, post_ids) -> set:
+    rows = db.query(models.interaction.HiddenPost.post_id).filter(
+        models.interaction.HiddenPost.user_id == user_id,
+        models.interaction.HiddenPost.post_id.in_(post_ids)
+    ).all()
+    return {row[0] for row in rows}
+
+# Viewer state operations
+def get_viewer_state(db: Session, user_id: int, post_ids):
+    """Return {post_id: {"liked", "got_it", "hidden"}} for the given posts in one query."""
+    Like, GotIt = models.interaction.Like, models.interaction.GotIt
+    post_ids = list(post_ids)
+    state = {post_id: {"liked": False, "got_it": False, "hidden": False} for post_id in post_ids}
+    if not post_ids:
+        return state
+    stmt = union_all(
+        select(Like.post_id, literal("liked")).where(Like.user_id == user_id, Like.post_id.in_(post_ids)),
+        select(GotIt.post_id, literal("got_it")).where(GotIt.user_id == user_id, GotIt.post_id.in_(post_ids)),
+        select(HiddenPost.post_id, literal("hidden")).where(HiddenPost.user_id == user_id, HiddenPost.post_id.in_(post_ids)),
+    )
+    for post_id, kind in db.execute(stmt):
+        state[post_id][kind] = True
+    return state
+
+def annotate_viewer_state(db: Session, posts, user_id: Optional[int]):
+    """Set liked_by_me/got_it_by_me/hidden_by_me on each post for the viewer."""
+    if user_id is None or not posts:
+        return posts
+    state = get_viewer_state(db, user_id, {post.id for post in posts})
+    for post in posts:
+        post.liked_by_me = state[post.id]["liked"]
+        post.got_it_by_me = state[post.id]["got_it"]
+        post.hidden_by_me = state[post.id]["hidden"]
+    return posts
+
 # Interaction operations
-def toggle_like(db: Session, post_id: int, user_id: int):
-    existing_like = db.query(models.interaction.Like).filter(
-        models.interaction.Like.post_id == post_id,
-        models.interaction.Like.user_id == user_id
-    ).first()
-    post = db.query(models.post.Post).filter(models.post.Post.id == post_id).first()
-    actor = db.query(models.user.User).filter(models.user.User.id == user_id).first()
-    if existing_like:
-        db.delete(existing_like)
-        db.commit()
-        return None
-    db_like = models.interaction.Like(post_id=post_id, user_id=user_id)
-    db.add(db_like)
-    db.commit()
-    db.refresh(db_like)
-    # Notification
-    create_notification(db, post, actor, NotificationType.LIKE, f"{actor.display_name or actor.username} liked your post")
-    return db_like
+# set_*/unset_* are idempotent and toggle_* flips the current state; all of them
+# return the resulting state and run in a single transaction. Pass commit=False
+# to batch several operations into the caller's transaction.
+def set_like(db: Session, post, actor, commit: bool = True) -> bool:
+    like_id = _insert_ignore(db, models.interaction.Like, post_id=post.id, user_id=actor.id)
+    if like_id is not None:
+        create_notification(db, post, actor, NotificationType.LIKE, f"{_actor_name(actor)} liked your post")
+    _commit_post_change(db, post.id, commit)
+    return True
+
+def unset_like(db: Session, post, actor, commit: bool = True) -> bool:
+    _delete_returning(
+        db, models.interaction.Like,
+        models.interaction.Like.post_id == post.id,
+        models.interaction.Like.user_id == actor.id
+    )
+    _commit_post_change(db, post.id, commit)
+    return False
+
+def toggle_like(db: Session, post, actor, commit: bool = True) -> bool:
+    deleted = _delete_returning(
+        db, models.interaction.Like,
+        models.interaction.Like.post_id == post.id,
+        models.interaction.Like.user_id == actor.id
+    )
+    if deleted is not None:
+        _commit_post_change(db, post.id, commit)
+        return False
+    return set_like(db, post, actor, commit=commit)
 
 def create_comment(db: Session, post_id: int, user_id: int, comment: schemas.CommentCreate):
     db_comment = models.interaction.Comment(**comment.dict(), post_id=post_id, user_id=user_id)
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
     # Notification
     post = db.query(models.post.Post).filter(models.post.Post.id == post_id).first()
     actor = db.query(models.user.User).filter(models.user.User.id == user_id).first()
-    create_notification(db, post, actor, NotificationType.COMMENT, f"{actor.display_name or actor.username} commented on your post")
+    create_notification(db, post, actor, NotificationType.COMMENT, f"{_actor_name(actor)} commented on your post")
+    _commit_post_change(db, post_id)
+    db.refresh(db_comment)
     return db_comment
 
-def toggle_got_it(db: Session, post_id: int, user_id: int):
-    post = get_post(db, post_id)
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+def _check_got_it_allowed(post):
     if post.is_gone:
         raise HTTPException(status_code=400, detail="This item has been reported as gone and can no longer be marked as 'Got It'.")
 
-    existing_got_it = db.query(models.interaction.GotIt).filter(
-        models.interaction.GotIt.post_id == post_id,
-        models.interaction.GotIt.user_id == user_id
-    ).first()
-    post = db.query(models.post.Post).filter(models.post.Post.id == post_id).first()
-    actor = db.query(models.user.User).filter(models.user.User.id == user_id).first()
-    if existing_got_it:
-        db.delete(existing_got_it)
-        db.commit()
-        return None
-    db_got_it = models.interaction.GotIt(
-        post_id=post_id, 
-        user_id=user_id, 
+def set_got_it(db: Session, post, actor, commit: bool = True) -> bool:
+    _check_got_it_allowed(post)
+    got_it_id = _insert_ignore(
+        db, models.interaction.GotIt,
+        post_id=post.id,
+        user_id=actor.id,
         giver_id=post.owner_id
     )
-    db.add(db_got_it)
-    db.commit()
-    db.refresh(db_got_it)
-    # Notification
-    create_notification(db, post, actor, NotificationType.GOT_IT, f"{actor.display_name or actor.username} got the item from your post")
-    return db_got_it
+    if got_it_id is not None:
+        create_notification(db, post, actor, NotificationType.GOT_IT, f"{_actor_name(actor)} got the item from your post")
+    _commit_post_change(db, post.id, commit)
+    return True
+
+def unset_got_it(db: Session, post, actor, commit: bool = True) -> bool:
+    _check_got_it_allowed(post)
+    _delete_returning(
+        db, models.interaction.GotIt,
+        models.interaction.GotIt.post_id == post.id,
+        models.interaction.GotIt.user_id == actor.id
+    )
+    _commit_post_change(db, post.id, commit)
+    return False
+
+def toggle_got_it(db: Session, post, actor, commit: bool = True) -> bool:
+    _check_got_it_allowed(post)
+    deleted = _delete_returning(
+        db, models.interaction.GotIt,
+        models.interaction.GotIt.post_id == post.id,
+        models.interaction.GotIt.user_id == actor.id
+    )
+    if deleted is not None:
+        _commit_post_change(db, post.id, commit)
+        return False
+    return set_got_it(db, post, actor, commit=commit)
 
 def delete_comment(db: Session, comment_id: int, user_id: int):
     comment = db.query(models.interaction.Comment).filter(models.interaction.Comment.id == comment_id).first()
@@ -243,43 +467,47 @@ def delete_comment(db: Session, comment_id: int, user_id: int):
         return False
     if comment.user_id != user_id:
         return False
+    post_id = comment.post_id
     db.delete(comment)
-    db.commit()
+    _commit_post_change(db, post_id)
     return True
 
 # Follow operations
-def toggle_follow(db: Session, follower_id: int, following_id: int):
-    existing_follow = db.query(models.follow.Follow).filter(
-        models.follow.Follow.follower_id == follower_id,
+def set_follow(db: Session, follower, following_id: int, commit: bool = True) -> bool:
+    follow_id = _insert_ignore(db, models.follow.Follow, follower_id=follower.id, following_id=following_id)
+    if follow_id is not None:
+        # Notify the user being followed
+        db.add(models.interaction.Notification(
+            user_id=following_id,
+            actor_id=follower.id,
+            type=models.interaction.NotificationType.FOLLOW,
+            message=f"{_actor_name(follower)} started following you."
+        ))
+    if commit:
+        db.commit()
+    return True
+
+def unset_follow(db: Session, follower, following_id: int, commit: bool = True) -> bool:
+    _delete_returning(
+        db, models.follow.Follow,
+        models.follow.Follow.follower_id == follower.id,
         models.follow.Follow.following_id == following_id
-    ).first()
-    
-    if existing_follow:
-        db.delete(existing_follow)
+    )
+    if commit:
         db.commit()
-        return None
-    
-    db_follow = models.follow.Follow(follower_id=follower_id, following_id=following_id)
-    db.add(db_follow)
-
-    # Create notification for the user being followed
-    try:
-        actor = db.query(models.user.User).filter(models.user.User.id == follower_id).first()
-        if actor:
-            notif = models.interaction.Notification(
-                user_id=following_id,  # The user being followed
-                actor_id=follower_id,  # The user who followed
-                type=models.interaction.NotificationType.FOLLOW,
-                message=f"{actor.display_name or actor.username} started following you."
-            )
-            db.add(notif)
-    except Exception as e:
-        # Log the error, but don't fail the follow action
-        print(f"Error creating follow notification: {e}")
+    return False
 
-    db.commit()
-    db.refresh(db_follow)
-    return db_follow
+def toggle_follow(db: Session, follower, following_id: int, commit: bool = True) -> bool:
+    deleted = _delete_returning(
+        db, models.follow.Follow,
+        models.follow.Follow.follower_id == follower.id,
+        models.follow.Follow.following_id == following_id
+    )
+    if deleted is not None:
+        if commit:
+            db.commit()
+        return False
+    return set_follow(db, follower, following_id, commit=commit)
 
 def get_user_followers(db: Session, user_id: int, skip: int = 0, limit: int = 20):
     return db.query(models.user.User).join(
@@ -295,6 +523,16 @@ def get_user_following(db: Session, user_id: int, skip: int = 0, limit: int = 20
         models.follow.Follow.follower_id == user_id
     ).offset(skip).limit(limit).all()
 
+def get_notifications_version(db: Session, user_id: int):
+    """(count, unread count, newest id, latest post update) of a user's notifications, for ETags of the list."""
+    Notification, Post = models.interaction.Notification, models.post.Post
+    return tuple(db.query(
+        func.count(Notification.id),
+        func.sum(case((Notification.is_read == False, 1), else_=0)),
+        func.max(Notification.id),
+        func.max(Post.updated_at)
+    ).outerjoin(Post, Post.id == Notification.post_id).filter(Notification.user_id == user_id).one())
+
 def mark_all_notifications_as_read(db: Session, user_id: int):
     db.query(models.interaction.Notification).filter(
         models.interaction.Notification.user_id == user_id,
@@ -303,6 +541,120 @@ def mark_all_notifications_as_read(db: Session, user_id: int):
     db.commit()
     return {"status": "success"}
 
+# Counter operations
+def get_post_counters(db: Session, post_ids):
+    Post = models.post.Post
+    likes_count, comments_count, got_it_count = post_counter_columns()
+    rows = db.query(Post.id, likes_count, comments_count, got_it_count).filter(Post.id.in_(post_ids)).all()
+    return [
+        {"post_id": row[0], "likes_count": row[1], "comments_count": row[2], "got_it_count": row[3]}
+        for row in rows
+    ]
+
+def get_user_follow_counters(db: Session, user_ids):
+    User, Follow = models.user.User, models.follow.Follow
+    followers_count = select(func.count(Follow.id)).where(Follow.following_id == User.id).correlate(User).scalar_subquery()
+    following_count = select(func.count(Follow.id)).where(Follow.follower_id == User.id).correlate(User).scalar_subquery()
+    rows = db.query(User.id, followers_count, following_count).filter(User.id.in_(user_ids)).all()
+    return [
+        {"user_id": row[0], "followers_count": row[1], "following_count": row[2]}
+        for row in rows
+    ]
+
+# Offline sync operations
+_POST_SYNC_ACTIONS = {
+    SyncAction.LIKE: set_like,
+    SyncAction.UNLIKE: unset_like,
+    SyncAction.GOT_IT: set_got_it,
+    SyncAction.UNDO_GOT_IT: unset_got_it,
+}
+_FOLLOW_SYNC_ACTIONS = {
+    SyncAction.FOLLOW: set_follow,
+    SyncAction.UNFOLLOW: unset_follow,
+}
+
+def _apply_sync_operation(db: Session, actor, operation: schemas.SyncOperation, posts: dict, user_ids: set) -> bool:
+    if operation.action in _FOLLOW_SYNC_ACTIONS:
+        if operation.target_id == actor.id:
+            raise HTTPException(status_code=400, detail="Cannot follow yourself")
+        if operation.target_id not in user_ids:
+            raise HTTPException(status_code=404, detail="User not found")
+        return _FOLLOW_SYNC_ACTIONS[operation.action](db, actor, operation.target_id, commit=False)
+
+    post = posts.get(operation.target_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if operation.action == SyncAction.HIDE:
+        return hide_post(db, user_id=actor.id, post_id=post.id, commit=False)
+    if operation.action == SyncAction.UNHIDE:
+        unhide_post(db, user_id=actor.id, post_id=post.id, commit=False)
+        return False
+    return _POST_SYNC_ACTIONS[operation.action](db, post, actor, commit=False)
+
+def apply_sync_operations(db: Session, actor, operations: List[schemas.SyncOperation]):
+    """Apply offline interaction operations in order, in a single transaction.
+
+    Operations whose idempotency key was already applied are reported as
+    duplicates with their recorded state instead of being replayed. Returns
+    the per-operation results and the ids of the posts and users touched.
+    """
+    keys = [operation.idempotency_key for operation in operations]
+    receipts = {
+        receipt.idempotency_key: receipt.state
+        for receipt in db.query(SyncReceipt).filter(
+            SyncReceipt.user_id == actor.id,
+            SyncReceipt.idempotency_key.in_(keys)
+        )
+    }
+
+    # Load every target up front so each operation costs only its write
+    post_ids = {op.target_id for op in operations if op.action not in _FOLLOW_SYNC_ACTIONS}
+    user_ids = {op.target_id for op in operations if op.action in _FOLLOW_SYNC_ACTIONS}
+    posts = {}
+    if post_ids:
+        posts = {post.id: post for post in db.query(models.post.Post).filter(models.post.Post.id.in_(post_ids))}
+    existing_user_ids = set()
+    if user_ids:
+        existing_user_ids = {row[0] for row in db.query(models.user.User.id).filter(models.user.User.id.in_(user_ids))}
+
+    results = []
+    touched_post_ids, touched_user_ids = set(), set()
+    for operation in operations:
+        result = {
+            "idempotency_key": operation.idempotency_key,
+            "action": operation.action,
+            "target_id": operation.target_id,
+        }
+        if operation.idempotency_key in receipts:
+            results.append({**result, "status": "duplicate", "state": receipts[operation.idempotency_key]})
+            continue
+        try:
+            state = _apply_sync_operation(db, actor, operation, posts, existing_user_ids)
+        except HTTPException as e:
+            results.append({**result, "status": "error", "detail": e.detail})
+            continue
+        # A concurrent sync with the same key may have recorded it already;
+        # the set/unset operations are idempotent, so keep whichever receipt won.
+        _insert_ignore(
+            db, SyncReceipt,
+            user_id=actor.id,
+            idempotency_key=operation.idempotency_key,
+            action=operation.action,
+            target_id=operation.target_id,
+            state=state
+        )
+        receipts[operation.idempotency_key] = state
+        if operation.action in _FOLLOW_SYNC_ACTIONS:
+            touched_user_ids.add(operation.target_id)
+        else:
+            touched_post_ids.add(operation.target_id)
+        results.append({**result, "status": "applied", "state": state})
+
+    db.commit()
+    for post_id in touched_post_ids:
+        get_post_cache().invalidate(post_id)
+    return results, touched_post_ids, touched_user_ids
+
 # Message operations
 def get_message(db: Session, message_id: int):
     return db.query(models.message.Message).filter(models.message.Message.id == message_id).first()
@@ -315,7 +667,9 @@ def get_user_messages(
     message_type: Optional[MessageType] = None,
     unread_only: bool = False
 ):
-    query = db.query(models.message.Message).filter(models.message.Message.receiver_id == user_id)
+    query = db.query(models.message.Message).options(
+        selectinload(models.message.Message.post)
+    ).filter(models.message.Message.receiver_id == user_id)
     
     if message_type:
         query = query.filter(models.message.Message.type == message_type)
@@ -376,11 +730,21 @@ def authenticate_user(db: Session, username: str, password: str):
     return user
 
 def create_notification(db, post, actor, notif_type, message=None):
+    # Adds the notification to the caller's transaction; the caller commits.
     # Don't notify if actor is the post owner
     if post.owner_id == actor.id:
         return None
     # Only one LIKE or GOT_IT notification per user per post
     if notif_type in [NotificationType.LIKE, NotificationType.GOT_IT]:
+        # The session doesn't autoflush, so also check notifications added
+        # earlier in the same transaction (e.g. like, unlike, like in one sync batch)
+        pending = any(
+            isinstance(obj, Notification) and obj.post_id == post.id
+            and obj.actor_id == actor.id and obj.type == notif_type
+            for obj in db.new
+        )
+        if pending:
+            return None
         existing = db.query(Notification).filter_by(
             user_id=post.owner_id,
             post_id=post.id,
@@ -397,6 +761,82 @@ def create_notification(db, post, actor, notif_type, message=None):
         message=message,
     )
     db.add(notif)
+    return notif
+
+# Area subscriptions
+SUBSCRIPTION_CELL_DEGREES = 0.25
+SUBSCRIPTION_MAX_RADIUS_KM = 50
+MAX_SUBSCRIPTIONS_PER_USER = 10
+
+def get_area_subscriptions(db: Session, user_id: int):
+    return db.query(AreaSubscription).filter(AreaSubscription.user_id == user_id).order_by(AreaSubscription.id).all()
+
+def create_area_subscription(db: Session, user_id: int, subscription: schemas.AreaSubscriptionCreate):
+    count = db.query(func.count(AreaSubscription.id)).filter(AreaSubscription.user_id == user_id).scalar()
+    if count >= MAX_SUBSCRIPTIONS_PER_USER:
+        raise HTTPException(status_code=400, detail=f"You can subscribe to at most {MAX_SUBSCRIPTIONS_PER_USER} areas")
+    category = subscription.category.value if subscription.category else None
+    db_subscription = AreaSubscription(
+        user_id=user_id,
+        latitude=subscription.latitude,
+        longitude=subscription.longitude,
+        radius_km=subscription.radius_km,
+        category=category
+    )
+    # Index the subscription under every grid cell its circle touches
+    db_subscription.cells = [
+        SubscriptionCell(cell_x=x, cell_y=y)
+        for x, y in geo.covering_cells(subscription.latitude, subscription.longitude, subscription.radius_km, SUBSCRIPTION_CELL_DEGREES)
+    ]
+    db.add(db_subscription)
+    db.commit()
+    db.refresh(db_subscription)
+    return db_subscription
+
+def delete_area_subscription(db: Session, subscription_id: int, user_id: int):
+    db_subscription = db.query(AreaSubscription).filter(
+        AreaSubscription.id == subscription_id,
+        AreaSubscription.user_id == user_id
+    ).first()
+    if not db_subscription:
+        return False
+    db.delete(db_subscription)
+    db.commit()
+    return True
+
+def notify_area_subscribers(db: Session, post):
+    """Notify every user with an area subscription covering this post; returns how many were notified.
+
+    Only subscriptions indexed under the post's grid cell are loaded, so the cost
+    depends on how many areas overlap the post rather than on the total number.
+    """
+    cell_x, cell_y = geo.grid_cell(post.latitude, post.longitude, SUBSCRIPTION_CELL_DEGREES)
+    candidates = db.query(AreaSubscription).join(
+        SubscriptionCell, SubscriptionCell.subscription_id == AreaSubscription.id
+    ).filter(
+        SubscriptionCell.cell_x == cell_x,
+        SubscriptionCell.cell_y == cell_y,
+        AreaSubscription.user_id != post.owner_id,
+        or_(AreaSubscription.category == None, AreaSubscription.category == post.category)
+    ).all()
+
+    user_ids = {
+        subscription.user_id for subscription in candidates
+        if haversine_distance(subscription.latitude, subscription.longitude, post.latitude, post.longitude) <= subscription.radius_km
+    }
+    if not user_ids:
+        return 0
+    db.execute(insert(Notification), [
+        {
+            "user_id": user_id,
+            "post_id": post.id,
+            "actor_id": post.owner_id,
+            "type": NotificationType.NEARBY,
+            "message": f"New freebie near you: {post.title}",
+            "created_at": datetime.utcnow(),
+            "is_read": False,
+        }
+        for user_id in sorted(user_ids)
+    ])
     db.commit()
-    db.refresh(notif)
-    return notif 
\ No newline at end of file
+    return len(user_ids)
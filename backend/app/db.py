@@ -1,13 +1,198 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from functools import lru_cache
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 from .config import get_settings
 
 settings = get_settings()
 
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+class PoolMetrics:
+    """Counters for a connection pool: checkouts, time spent waiting for a connection and timeouts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checked_out": self.checked_out,
+                "timeouts": self.timeouts,
+                "wait_total_ms": round(self.wait_total * 1000, 3),
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection."""
+
+    metrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics:
+                self.metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        if self.metrics:
+            self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+def _instrument_pool(engine, metrics: PoolMetrics):
+    if isinstance(engine.pool, TimedQueuePool):
+        engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        with metrics._lock:
+            metrics.connects += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        with metrics._lock:
+            metrics.checkouts += 1
+            metrics.checked_out += 1
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        with metrics._lock:
+            metrics.checked_out -= 1
+
+
+def _apply_sqlite_profile(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the single writer; NORMAL is durable in WAL mode
+    # except for the last transactions before a power loss
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def run_sqlite_maintenance(db):
+    """Refresh planner statistics and checkpoint the WAL; a no-op on other databases."""
+    if db.bind.dialect.name != "sqlite":
+        return None
+    connection = db.connection()
+    connection.exec_driver_sql("PRAGMA optimize")
+    busy, wal_pages, checkpointed = connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+    db.commit()
+    return {"wal_pages": wal_pages, "checkpointed": checkpointed, "busy": bool(busy)}
+
+
+def create_db_engine(database_url: str, **overrides):
+    """Create an engine with pool settings suited to the database dialect.
+
+    SQLite gets a thread-shareable connection (a single static one for
+    in-memory databases), and file databases get the WAL/mmap profile when
+    SQLITE_TUNED is set. Server databases get a sized pool with pre-ping,
+    recycling and, on Postgres, a per-connection statement timeout.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        in_memory = url.database in (None, "", ":memory:")
+        kwargs["poolclass"] = StaticPool if in_memory else TimedQueuePool
+    else:
+        kwargs = {
+            "poolclass": TimedQueuePool,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+        }
+        if backend == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+            kwargs["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    kwargs.update(overrides)
+
+    engine = create_engine(url, **kwargs)
+    if backend == "sqlite" and not in_memory and settings.SQLITE_TUNED:
+        event.listen(engine, "connect", _apply_sqlite_profile)
+    engine.pool_metrics = PoolMetrics()
+    _instrument_pool(engine, engine.pool_metrics)
+    return engine
+
+
+def get_pool_stats(engine):
+    """Current pool occupancy plus the engine's cumulative checkout metrics."""
+    stats = engine.pool_metrics.snapshot()
+    if isinstance(engine.pool, QueuePool):
+        stats.update({
+            "pool_size": engine.pool.size(),
+            "idle": engine.pool.checkedin(),
+            "overflow": engine.pool.overflow(),
+        })
+    return stats
+
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def create_async_db_engine(database_url: str, **overrides):
+    """Async counterpart of create_db_engine, using aiosqlite or asyncpg."""
+    # Imported here so the sync app runs without the async drivers installed
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if backend == "sqlite":
+        kwargs = {}
+        in_memory = url.database in (None, "", ":memory:")
+        if in_memory:
+            kwargs["poolclass"] = StaticPool
+    else:
+        kwargs = {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+        }
+        if settings.DB_STATEMENT_TIMEOUT_MS:
+            kwargs["connect_args"] = {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+    kwargs.update(overrides)
+
+    async_engine = create_async_engine(url, **kwargs)
+    if backend == "sqlite" and not in_memory and settings.SQLITE_TUNED:
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_profile)
+    async_engine.sync_engine.pool_metrics = PoolMetrics()
+    _instrument_pool(async_engine.sync_engine, async_engine.sync_engine.pool_metrics)
+    return async_engine
+
+
+engine = create_db_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -17,4 +202,14 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+@lru_cache()
+def get_async_sessionmaker():
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    # Objects stay usable after commit; reloading them would need an await
+    return async_sessionmaker(create_async_db_engine(settings.DATABASE_URL), autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
@@ -0,0 +1,48 @@
+"""Weak ETags and conditional GET for frequently re-polled resources.
+
+A route computes an ETag from what its response depends on before building
+the body, and answers a matching ``If-None-Match`` with 304 and no body:
+
+    etag = etags.weak_etag(etags.row_version(user), user.stats, request.base_url)
+    if etags.client_has(request, etag):
+        return etags.not_modified(etag)
+    etags.tag(response, etag)
+
+Responses are marked ``private, no-cache``, so clients revalidate every
+time and shared caches don't keep per-user data.
+"""
+import hashlib
+
+from fastapi import Request, Response
+from sqlalchemy import inspect
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def row_version(obj) -> tuple:
+    """The values of an ORM object's mapped columns."""
+    return tuple(getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs)
+
+
+def client_has(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" match
+    return etag.removeprefix("W/") in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+def tag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
@@ -0,0 +1,114 @@
+"""Streaming exports of posts, interactions and a user's data as NDJSON or CSV.
+
+Rows are read with a streaming cursor (server-side on Postgres) in batches of
+EXPORT_BATCH_SIZE and encoded batch by batch, optionally through a gzip
+compressor, so memory use is bounded by one batch however large the table.
+Exports read from a replica when DATABASE_REPLICA_URLS is set.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import select, or_
+from app.replicas import read_router
+from app.models.user import User
+from app.models.post import Post
+from app.models.follow import Follow
+from app.models.interaction import Comment, Like, GotIt, HiddenPost, Notification, AreaSubscription
+from app.models.message import Message
+from app.models.archive import ArchivedPost
+
+EXPORT_BATCH_SIZE = 1000
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+TABLES = {
+    "posts": Post.__table__,
+    "comments": Comment.__table__,
+    "likes": Like.__table__,
+    "got_it": GotIt.__table__,
+}
+PRIVATE_USER_COLUMNS = {"hashed_password"}
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _stream(statement):
+    """Yield lists of row dicts, one batch at a time, from a read session."""
+    db = read_router.session_for(None)
+    try:
+        result = db.connection().execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(statement)
+        for batch in result.mappings().partitions():
+            yield [{key: _value(value) for key, value in row.items()} for row in batch]
+    finally:
+        db.close()
+
+
+def table_export(kind: str, since: datetime = None):
+    """(columns, batches) for one of TABLES, ordered by id, optionally only rows created since a time."""
+    table = TABLES[kind]
+    statement = select(table).order_by(table.c.id)
+    if since is not None:
+        statement = statement.where(table.c.created_at >= since)
+    return [column.name for column in table.columns], _stream(statement)
+
+
+def user_export(user_id: int):
+    """Batches of everything stored about a user, each row tagged with its "type"."""
+    user_columns = [column for column in User.__table__.columns if column.name not in PRIVATE_USER_COLUMNS]
+    sections = [
+        ("profile", select(*user_columns).where(User.id == user_id)),
+        ("post", select(Post.__table__).where(Post.owner_id == user_id).order_by(Post.id)),
+        ("archived_post", select(ArchivedPost.__table__).where(ArchivedPost.owner_id == user_id).order_by(ArchivedPost.id)),
+        ("comment", select(Comment.__table__).where(Comment.user_id == user_id).order_by(Comment.id)),
+        ("like", select(Like.__table__).where(Like.user_id == user_id).order_by(Like.id)),
+        ("got_it", select(GotIt.__table__).where(or_(GotIt.user_id == user_id, GotIt.giver_id == user_id)).order_by(GotIt.id)),
+        ("follow", select(Follow.__table__).where(or_(Follow.follower_id == user_id, Follow.following_id == user_id)).order_by(Follow.id)),
+        ("message", select(Message.__table__).where(or_(Message.sender_id == user_id, Message.receiver_id == user_id)).order_by(Message.id)),
+        ("notification", select(Notification.__table__).where(Notification.user_id == user_id).order_by(Notification.id)),
+        ("hidden_post", select(HiddenPost.__table__).where(HiddenPost.user_id == user_id).order_by(HiddenPost.id)),
+        ("area_subscription", select(AreaSubscription.__table__).where(AreaSubscription.user_id == user_id).order_by(AreaSubscription.id)),
+    ]
+    for record_type, statement in sections:
+        for batch in _stream(statement):
+            yield [{"type": record_type, **row} for row in batch]
+
+
+def encode_ndjson(batches):
+    for batch in batches:
+        yield "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in batch).encode()
+
+
+def encode_csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode(columns, batches, format: str = "ndjson", gzip: bool = False):
+    """Encode batches from table_export/user_export as a stream of bytes."""
+    chunks = encode_csv(columns, batches) if format == "csv" else encode_ndjson(batches)
+    return gzip_chunks(chunks) if gzip else chunks
@@ -0,0 +1,46 @@
+import math
+
+EARTH_RADIUS_KM = 6371
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float):
+    """Return (min_lat, max_lat, lng_ranges) enclosing a circle of radius_km.
+
+    lng_ranges is a list of (min_lng, max_lng) pairs; it has two entries when
+    the box crosses the antimeridian.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+    cos_lat = math.cos(math.radians(latitude))
+    if min_lat <= -90 or max_lat >= 90 or cos_lat < 1e-9:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat))
+    if dlng >= 180:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    min_lng, max_lng = longitude - dlng, longitude + dlng
+    if min_lng < -180:
+        return min_lat, max_lat, [(min_lng + 360, 180.0), (-180.0, max_lng)]
+    if max_lng > 180:
+        return min_lat, max_lat, [(min_lng, 180.0), (-180.0, max_lng - 360)]
+    return min_lat, max_lat, [(min_lng, max_lng)]
+
+
+def grid_cell(latitude: float, longitude: float, cell_degrees: float):
+    """Return the (x, y) index of the fixed lat/lng grid cell containing a point."""
+    return math.floor((longitude + 180) / cell_degrees), math.floor((latitude + 90) / cell_degrees)
+
+
+def covering_cells(latitude: float, longitude: float, radius_km: float, cell_degrees: float):
+    """Return every grid cell (x, y) that intersects a circle of radius_km."""
+    min_lat, max_lat, lng_ranges = bounding_box(latitude, longitude, radius_km)
+    max_x = math.floor(360 / cell_degrees) - 1
+    _, y0 = grid_cell(min_lat, 0, cell_degrees)
+    _, y1 = grid_cell(max_lat, 0, cell_degrees)
+    cells = set()
+    for min_lng, max_lng in lng_ranges:
+        x0, _ = grid_cell(0, min_lng, cell_degrees)
+        x1, _ = grid_cell(0, max_lng, cell_degrees)
+        for x in range(x0, min(x1, max_x) + 1):
+            for y in range(y0, y1 + 1):
+                cells.add((x, y))
+    return sorted(cells)
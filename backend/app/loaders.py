@@ -0,0 +1,102 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from fastapi import Depends
+from app.db import get_db
+from app.replicas import get_read_db
+from app.models.user import User
+from app.models.post import Post
+from app.models.interaction import GotIt, Like, Comment
+from app.models.archive import ArchivedPost
+
+
+def user_stats_columns():
+    """Correlated (posts, got_it, gave) counts for a query over User."""
+    # Archived posts still count towards the owner's level
+    posts_count = (
+        select(func.count(Post.id)).where(Post.owner_id == User.id).correlate(User).scalar_subquery()
+        + select(func.count(ArchivedPost.id)).where(ArchivedPost.owner_id == User.id).correlate(User).scalar_subquery()
+    )
+    got_it_count = select(func.count(GotIt.id)).where(GotIt.user_id == User.id).correlate(User).scalar_subquery()
+    gave_count = select(func.count(GotIt.id)).where(GotIt.giver_id == User.id).correlate(User).scalar_subquery()
+    return posts_count, got_it_count, gave_count
+
+
+def post_counter_columns():
+    """Correlated (likes, comments, got_it) counts for a query over Post."""
+    return tuple(
+        select(func.count(model.id)).where(model.post_id == Post.id).correlate(Post).scalar_subquery()
+        for model in (Like, Comment, GotIt)
+    )
+
+
+class UserLoader:
+    """Request-scoped batch loader for users and their stats.
+
+    Collects the user ids a response needs (post owners, notification actors,
+    message senders/receivers, commenters) and loads them with their stats in
+    a single query. Loaded users live in the session identity map, so lazy
+    relationship access such as ``post.owner`` resolves without SQL, and their
+    stats are primed so ``level_info`` does not run its own count queries.
+
+    ``prime_posts`` also loads the like/comment/got-it counts of a page of
+    posts in one query, instead of each count property loading its collection.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._users = {}
+
+    def load_many(self, user_ids):
+        missing = {user_id for user_id in user_ids if user_id is not None and user_id not in self._users}
+        if missing:
+            rows = self.db.query(User, *user_stats_columns()).filter(User.id.in_(missing)).all()
+            for user, posts, got_it, gave in rows:
+                user.prime_stats({"posts": posts, "got_it": got_it, "gave": gave})
+                self._users[user.id] = user
+        return {user_id: self._users[user_id] for user_id in user_ids if user_id in self._users}
+
+    def load(self, user_id):
+        return self.load_many([user_id]).get(user_id)
+
+    def prime_users(self, users):
+        self.load_many({user.id for user in users})
+        return users
+
+    def prime_posts(self, posts):
+        self.load_many({post.owner_id for post in posts if post is not None})
+        unprimed = {
+            post.id: post for post in posts
+            if isinstance(post, Post) and post.__dict__.get("_primed_counters") is None
+        }
+        if unprimed:
+            rows = self.db.query(Post.id, *post_counter_columns()).filter(Post.id.in_(unprimed)).all()
+            for post_id, likes, comments, got_it in rows:
+                unprimed[post_id].prime_counters(likes, comments, got_it)
+        return posts
+
+    def prime_comments(self, comments):
+        self.load_many({comment.user_id for comment in comments})
+        return comments
+
+    def prime_notifications(self, notifications):
+        self.load_many({notification.actor_id for notification in notifications})
+        self.prime_posts([notification.post for notification in notifications if notification.post is not None])
+        return notifications
+
+    def prime_messages(self, messages):
+        user_ids = set()
+        for message in messages:
+            user_ids.update((message.sender_id, message.receiver_id))
+            if message.post is not None:
+                user_ids.add(message.post.owner_id)
+        self.load_many(user_ids)
+        return messages
+
+
+def get_user_loader(db: Session = Depends(get_db)):
+    return UserLoader(db)
+
+
+def get_read_user_loader(db: Session = Depends(get_read_db)):
+    """Loader sharing the session of get_read_db, for routes that read from replicas."""
+    return UserLoader(db)
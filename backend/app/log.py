@@ -0,0 +1,205 @@
+"""Logging setup: non-blocking, structured and sampled.
+
+``setup_logging`` puts a QueueHandler on the root logger. Request threads
+only filter a record and put it on a queue. A QueueListener thread formats
+it and does the I/O: one JSON object per line on stderr, or plain text with
+LOG_FORMAT=text.
+
+Before a record is queued:
+
+* it gets the request id (RequestIdMiddleware, echoed in ``X-Request-ID``)
+  and the user from the bearer token;
+* loggers listed in LOG_SAMPLE_RATES, e.g. ``app.routes.users=0.1``, keep
+  only that fraction of their records below WARNING;
+* each logger may emit LOG_RATE_LIMIT_PER_SECOND records below ERROR per
+  second. The next record let through carries a ``suppressed`` count.
+
+LOG_LEVEL sets the root level, and LOG_LEVELS sets levels per logger, e.g.
+``app.routes.users=DEBUG``. Debug calls in the routes use %-style arguments,
+so at the default INFO level they return before formatting anything.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.config import get_settings
+from app.replicas import current_subject
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "request_id", "user"}
+
+
+def _parse_mapping(value: str):
+    """"a=1,b=2" -> {"a": "1", "b": "2"}"""
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {name.strip(): setting.strip() for name, setting in pairs}
+
+
+def _lookup(mapping: dict, logger_name: str):
+    """The entry for the logger or its nearest configured ancestor."""
+    name = logger_name
+    while name:
+        if name in mapping:
+            return mapping[name]
+        name = name.rpartition(".")[0]
+    return None
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        record.user = current_subject.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Per-logger sampling below WARNING and a per-logger rate limit below ERROR."""
+
+    def __init__(self, sample_rates: dict, rate_limit: float):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.rate_limit = rate_limit
+        self._lock = threading.Lock()
+        self._buckets = {}  # logger name -> [tokens, last refill, suppressed]
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING and self.sample_rates:
+            rate = _lookup(self.sample_rates, record.name)
+            if rate is not None and random.random() >= rate:
+                return False
+        if record.levelno >= logging.ERROR or self.rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [self.rate_limit, now, 0]
+            bucket[0] = min(self.rate_limit, bucket[0] + (now - bucket[1]) * self.rate_limit)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "user", None):
+            entry["user"] = record.user
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Merge args and render the traceback on the logging thread, while
+        # they're still valid, but leave the formatting to the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def queued(*handlers) -> QueueHandler:
+    """A QueueHandler whose records are written to handlers by a background thread."""
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return _QueueHandler(records)
+
+
+_configured = False
+
+
+def setup_logging():
+    """Configure the root logger as described above; later calls do nothing."""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    settings = get_settings()
+
+    output = logging.StreamHandler(sys.stderr)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    handler = queued(output)
+    handler.addFilter(SamplingFilter(
+        {name: float(rate) for name, rate in _parse_mapping(settings.LOG_SAMPLE_RATES).items()},
+        settings.LOG_RATE_LIMIT_PER_SECOND,
+    ))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in _parse_mapping(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+
+class RequestIdMiddleware:
+    """Gives each request an id, taken from a sane X-Request-ID header or generated, and echoes it back."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rid = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                value = value.decode("latin-1")
+                if 0 < len(value) <= 128 and value.isprintable():
+                    rid = value
+                break
+        rid = rid or uuid.uuid4().hex
+        reset = request_id.set(rid)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", rid.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(reset)
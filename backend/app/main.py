@@ -1,23 +1,33 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
 import os
-from app.routes import auth, posts, users, messages
-from app.db import engine
-from app.models import user, post, follow, interaction, message
+from app.routes import auth, posts, users, messages, sync, subscriptions, export
+from app.db import engine, get_pool_stats
+from app.replicas import RequestSubjectMiddleware, read_router
+from app.config import get_settings
+from app import tasks, metrics, slow_queries, log
+from app.compression import JSONGZipMiddleware
+from app.models import user, post, follow, interaction, message, archive
 
 # Create necessary directories
 os.makedirs("uploads/posts", exist_ok=True)
 os.makedirs("uploads/profiles", exist_ok=True)
 
+log.setup_logging()
+slow_queries.install()
+
 # Create database tables
 user.Base.metadata.create_all(bind=engine)
 post.Base.metadata.create_all(bind=engine)
 follow.Base.metadata.create_all(bind=engine)
 interaction.Base.metadata.create_all(bind=engine)
 message.Base.metadata.create_all(bind=engine)
+archive.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Freebies API")
+app.router.route_class = metrics.TimedRoute
 
 # Configure CORS
 app.add_middleware(
@@ -28,6 +38,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses for clients that accept gzip
+if get_settings().COMPRESSION_MIN_BYTES > 0:
+    app.add_middleware(
+        JSONGZipMiddleware,
+        minimum_size=get_settings().COMPRESSION_MIN_BYTES,
+        compresslevel=get_settings().COMPRESSION_LEVEL,
+    )
+
+# Identify the caller for read-your-writes routing of read-only requests
+app.add_middleware(RequestSubjectMiddleware)
+
+# Timings cover the whole request
+if get_settings().METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware, server_timing=get_settings().SERVER_TIMING_ENABLED)
+
+# Tag log records with a request id
+app.add_middleware(log.RequestIdMiddleware)
+
 # Mount static files for uploaded images
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
@@ -36,7 +64,31 @@ app.include_router(auth.router)
 app.include_router(posts.router)
 app.include_router(users.router)
 app.include_router(messages.router)
+app.include_router(sync.router)
+app.include_router(subscriptions.router)
+app.include_router(export.router)
+
+@app.on_event("startup")
+def start_background_jobs():
+    # Off by default; enable on exactly one process when running several
+    if get_settings().ENABLE_BACKGROUND_JOBS:
+        tasks.scheduler.start()
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    tasks.scheduler.stop()
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to Freebies API"} 
\ No newline at end of file
+    return {"message": "Welcome to Freebies API"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    pools = {"primary": get_pool_stats(engine)}
+    for i, replica in enumerate(read_router.replicas):
+        pools[f"replica{i}"] = get_pool_stats(replica.engine)
+    return PlainTextResponse(metrics.render(pools), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/db")
+def database_health():
+    return {"dialect": engine.dialect.name, "pool": get_pool_stats(engine), "replicas": read_router.status()} 
\ No newline at end of file
@@ -0,0 +1,278 @@
+"""Per-route request metrics: latency, SQL statement count, DB time and serialization time.
+
+MetricsMiddleware starts a RequestStats for each HTTP request in a context
+variable. Engine-wide cursor hooks add every statement's count and duration
+to it, whichever engine runs them (sync, async or replica), and TimedRoute
+records when the endpoint returned, so the time FastAPI spends validating
+and serializing the response can be told apart. Routes that serialize
+inside the endpoint (``serialization.respond``) add that time through
+``serializing``. When the response finishes,
+the stats go into per-route histograms rendered by ``render`` in the
+Prometheus text format. They are also sent back in a ``Server-Timing``
+header.
+
+The overhead is a couple of perf_counter calls per statement and a locked
+histogram update per request.
+"""
+import asyncio
+import functools
+from contextlib import contextmanager
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from app import profiling
+from app.config import get_settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class RequestStats:
+    __slots__ = ("start", "queries", "db_time", "endpoint_done", "serialize_time")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.endpoint_done = None
+        self.serialize_time = 0.0
+
+
+current_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats.get()
+    if stats is not None and context is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - context._metrics_start
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, method: str, route: str, status: int, stats: RequestStats, duration: float):
+        with self._lock:
+            metrics = self._routes.get((method, route, status))
+            if metrics is None:
+                metrics = self._routes[(method, route, status)] = RouteMetrics()
+            metrics.duration.observe(duration)
+            metrics.queries.observe(stats.queries)
+            metrics.db_seconds += stats.db_time
+            metrics.serialize_seconds += stats.serialize_time
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                key: (list(m.duration.counts), m.duration.sum, list(m.queries.counts), m.queries.sum,
+                      m.db_seconds, m.serialize_seconds)
+                for key, m in self._routes.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+registry = Registry()
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def _histogram_lines(name, labels, buckets, counts, total):
+    cumulative = 0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+    cumulative += counts[-1]
+    yield f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}'
+    yield f"{name}_sum{{{labels}}} {total}"
+    yield f"{name}_count{{{labels}}} {cumulative}"
+
+
+def render(pools=None):
+    """Prometheus text exposition of the request metrics, plus pool gauges for {name: get_pool_stats(...)}."""
+    snapshot = registry.snapshot()
+    lines = [
+        "# HELP http_request_duration_seconds Request latency until the response finished",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route, status), (counts, total, *_) in sorted(snapshot.items()):
+        lines.extend(_histogram_lines("http_request_duration_seconds", _labels(method=method, route=route, status=status),
+                                      LATENCY_BUCKETS, counts, total))
+    lines += [
+        "# HELP http_request_db_queries SQL statements executed per request",
+        "# TYPE http_request_db_queries histogram",
+    ]
+    for (method, route, status), (_, _, counts, total, *_) in sorted(snapshot.items()):
+        lines.extend(_histogram_lines("http_request_db_queries", _labels(method=method, route=route, status=status),
+                                      QUERY_BUCKETS, counts, int(total)))
+    for name, index, help_text in (
+        ("http_request_db_seconds_total", 4, "Time spent executing SQL statements"),
+        ("http_request_serialize_seconds_total", 5, "Time spent validating and encoding response bodies"),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (method, route, status), values in sorted(snapshot.items()):
+            lines.append(f"{name}{{{_labels(method=method, route=route, status=status)}}} {values[index]}")
+    pools = pools or {}
+    # Group by metric rather than by engine, as the exposition format expects
+    for key in dict.fromkeys(key for stats in pools.values() for key in stats):
+        lines.append(f"# TYPE db_pool_{key} gauge")
+        for engine_name, stats in pools.items():
+            if key in stats:
+                lines.append(f'db_pool_{key}{{{_labels(engine=engine_name)}}} {stats[key]}')
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(stats: RequestStats, total: float):
+    parts = [
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+        f"app;dur={max(total - stats.db_time - stats.serialize_time, 0) * 1000:.1f}",
+    ]
+    if stats.endpoint_done is not None:
+        parts.append(f"serialize;dur={stats.serialize_time * 1000:.1f}")
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _route_label(scope):
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounted apps (uploads) and unmatched paths; avoid one series per URL
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        reset = current_stats.set(stats)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    timing = server_timing(stats, time.perf_counter() - stats.start)
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_stats.reset(reset)
+            registry.record(scope["method"], _route_label(scope), status, stats, time.perf_counter() - stats.start)
+
+
+@contextmanager
+def serializing():
+    """Count the time spent in the block as serialization time of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_stats.get()
+        if stats is not None:
+            stats.serialize_time += time.perf_counter() - start
+
+
+def _mark_endpoint_done():
+    stats = current_stats.get()
+    if stats is not None:
+        stats.endpoint_done = time.perf_counter()
+
+
+def _timed_endpoint(endpoint):
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_done()
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_done()
+    timed.is_timed = True
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that records how long response validation and serialization take.
+
+    It also runs the endpoint under the profiler when the request asks for a profile.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        # include_router re-creates routes from the already wrapped endpoint
+        if not getattr(endpoint, "is_timed", False):
+            endpoint = _timed_endpoint(profiling.profiled(endpoint))
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            profile = profiling.for_request(request, self.path)
+            reset = profiling.current_profile.set(profile)
+            try:
+                response = await handler(request)
+            finally:
+                profiling.current_profile.reset(reset)
+            stats = current_stats.get()
+            if stats is not None and stats.endpoint_done is not None:
+                stats.serialize_time += time.perf_counter() - stats.endpoint_done
+            if profile is not None:
+                filename = await run_in_threadpool(profile.write, get_settings().PROFILE_DIR)
+                response.headers["X-Profile"] = filename or "busy"
+            return response
+
+        return timed_handler
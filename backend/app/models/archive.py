@@ -0,0 +1,63 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Float, Boolean
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.db import Base
+
+class ArchivedPost(Base):
+    """A gone post moved out of the hot posts table, with its counters frozen at archive time."""
+    __tablename__ = "archived_posts"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # original post id
+    title = Column(String)
+    description = Column(String)
+    category = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    address = Column(String, nullable=True)
+    city = Column(String, nullable=True)
+    state = Column(String, nullable=True)
+    photo_url = Column(String)
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    is_gone = Column(Boolean, default=True)
+    expires_at = Column(DateTime, nullable=True)
+    likes_count = Column(Integer, default=0)
+    comments_count = Column(Integer, default=0)
+    got_it_count = Column(Integer, default=0)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    owner = relationship("User")
+
+    @property
+    def city_label(self):
+        if self.city and self.state:
+            return f"{self.city}, {self.state}"
+        return self.city
+
+class ArchivedComment(Base):
+    __tablename__ = "archived_comments"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    content = Column(Text)
+    post_id = Column(Integer, ForeignKey("archived_posts.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime)
+
+class ArchivedLike(Base):
+    __tablename__ = "archived_likes"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    post_id = Column(Integer, ForeignKey("archived_posts.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime)
+
+class ArchivedGotIt(Base):
+    """Which post a got_it row belonged to; the got_it row itself stays (post_id nulled) for user stats."""
+    __tablename__ = "archived_got_it"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # got_it.id
+    post_id = Column(Integer, ForeignKey("archived_posts.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    giver_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, UniqueConstraint, Enum as SqlEnum, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, UniqueConstraint, Enum as SqlEnum, Boolean, Float
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db import Base
@@ -6,6 +6,8 @@ import enum
 
 class Comment(Base):
     __tablename__ = "comments"
+    # Archived comments keep their ids, so SQLite must not reuse them (see archive.py)
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text)
@@ -18,7 +20,7 @@ class Comment(Base):
 
 class Like(Base):
     __tablename__ = "likes"
-    __table_args__ = (UniqueConstraint('post_id', 'user_id', name='unique_like'),)
+    __table_args__ = (UniqueConstraint('post_id', 'user_id', name='unique_like'), {"sqlite_autoincrement": True})
 
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(Integer, ForeignKey("posts.id"))
@@ -30,7 +32,7 @@ class Like(Base):
 
 class GotIt(Base):
     __tablename__ = "got_it"
-    __table_args__ = (UniqueConstraint('post_id', 'user_id', name='unique_got_it'),)
+    __table_args__ = (UniqueConstraint('post_id', 'user_id', name='unique_got_it'), {"sqlite_autoincrement": True})
 
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(Integer, ForeignKey("posts.id"), nullable=True)
@@ -57,6 +59,7 @@ class NotificationType(enum.Enum):
     GOT_IT = "got_it"
     COMMENT = "comment"
     FOLLOW = "follow"
+    NEARBY = "nearby"
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -71,4 +74,50 @@ class Notification(Base):
     is_read = Column(Boolean, default=False)
 
     post = relationship("Post", back_populates="notifications")
-    actor = relationship("User", foreign_keys=[actor_id]) 
\ No newline at end of file
+    actor = relationship("User", foreign_keys=[actor_id]) 
+
+class AreaSubscription(Base):
+    """A user's request to be notified about new posts within radius_km of a point."""
+    __tablename__ = "area_subscriptions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    radius_km = Column(Float)
+    category = Column(String, nullable=True)  # None matches every category
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    cells = relationship("SubscriptionCell", cascade="all, delete-orphan")
+
+class SubscriptionCell(Base):
+    """Reverse index from grid cell to the subscriptions whose circle intersects it."""
+    __tablename__ = "subscription_cells"
+
+    cell_x = Column(Integer, primary_key=True)
+    cell_y = Column(Integer, primary_key=True)
+    subscription_id = Column(Integer, ForeignKey("area_subscriptions.id", ondelete="CASCADE"), primary_key=True)
+
+# Offline sync operation enum
+class SyncAction(enum.Enum):
+    LIKE = "like"
+    UNLIKE = "unlike"
+    GOT_IT = "got_it"
+    UNDO_GOT_IT = "undo_got_it"
+    HIDE = "hide"
+    UNHIDE = "unhide"
+    FOLLOW = "follow"
+    UNFOLLOW = "unfollow"
+
+class SyncReceipt(Base):
+    """Result of an applied /sync operation, keyed by the client's idempotency key."""
+    __tablename__ = "sync_receipts"
+    __table_args__ = (UniqueConstraint('user_id', 'idempotency_key', name='unique_sync_receipt'),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    idempotency_key = Column(String)
+    action = Column(SqlEnum(SyncAction))
+    target_id = Column(Integer)
+    state = Column(Boolean)
+    created_at = Column(DateTime, default=datetime.utcnow)
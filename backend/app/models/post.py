@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Float, Enum, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Float, Enum, Boolean, Index, func
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from datetime import datetime, timedelta
 import enum
 from app.db import Base
+from app.config import get_settings
 
 class PostCategory(enum.Enum):
     LEFTOVERS = "leftovers"
@@ -10,8 +11,54 @@ class PostCategory(enum.Enum):
     RESTAURANT = "restaurant"
     HOME_MADE = "home_made"
 
+STATE_ABBREVIATIONS = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'california': 'CA', 'colorado': 'CO',
+    'connecticut': 'CT', 'delaware': 'DE', 'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID',
+    'illinois': 'IL', 'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS', 'kentucky': 'KY', 'louisiana': 'LA',
+    'maine': 'ME', 'maryland': 'MD', 'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN',
+    'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV',
+    'new hampshire': 'NH', 'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY', 'north carolina': 'NC',
+    'north dakota': 'ND', 'ohio': 'OH', 'oklahoma': 'OK', 'oregon': 'OR', 'pennsylvania': 'PA',
+    'rhode island': 'RI', 'south carolina': 'SC', 'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX',
+    'utah': 'UT', 'vermont': 'VT', 'virginia': 'VA', 'washington': 'WA', 'west virginia': 'WV',
+    'wisconsin': 'WI', 'wyoming': 'WY'
+}
+
+def parse_city_state(address):
+    """Extract (city, state abbreviation) from a free-form address. Either may be None."""
+    if not address:
+        return None, None
+    parts = [p.strip() for p in address.split(',')]
+    # Remove empty, numeric (zip), and irrelevant parts
+    filtered = [p for p in parts if p and not p.isdigit() and 'county' not in p.lower() and 'united states' not in p.lower()]
+    for i in range(len(filtered)-1):
+        part = filtered[i]
+        next_part = filtered[i+1]
+        # Heuristic: city is not a state abbreviation, state is 2-letter or full state name
+        if len(next_part) == 2 and next_part.isalpha():
+            return part, next_part.upper()
+        # Or, if state is a full name (e.g., 'Washington')
+        state_lower = next_part.lower()
+        if state_lower in STATE_ABBREVIATIONS:
+            return part, STATE_ABBREVIATIONS[state_lower]
+    # Fallback: first non-numeric, non-county part
+    for part in filtered:
+        if not part.isdigit():
+            return part, None
+    return address.strip(), None
+
+def compute_expires_at(category, created_at):
+    """Return when a post in this category stops being fresh, or None if it never expires."""
+    category = category.value if hasattr(category, 'value') else category
+    ttl_hours = get_settings().post_ttl_hours.get(category)
+    if ttl_hours is None:
+        return None
+    return created_at + timedelta(hours=ttl_hours)
+
 class Post(Base):
     __tablename__ = "posts"
+    # Archived posts keep their ids, so SQLite must not reuse them (see archive.py)
+    __table_args__ = {"sqlite_autoincrement": True}
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
@@ -20,11 +67,15 @@ class Post(Base):
     latitude = Column(Float)
     longitude = Column(Float)
     address = Column(String, nullable=True)
+    # Derived from address at write time (see parse_city_state)
+    city = Column(String, nullable=True)
+    state = Column(String, nullable=True, index=True)
     photo_url = Column(String)
     owner_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_gone = Column(Boolean, default=False)
+    expires_at = Column(DateTime, nullable=True)
 
     owner = relationship("User", back_populates="posts")
     comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
@@ -33,58 +84,52 @@ class Post(Base):
     messages = relationship("Message", back_populates="post", cascade="all, delete-orphan")
     notifications = relationship("Notification", back_populates="post", cascade="all, delete-orphan")
 
+    # Per-viewer state, filled in by crud.annotate_viewer_state
+    liked_by_me = False
+    got_it_by_me = False
+    hidden_by_me = False
+
+    def prime_counters(self, likes, comments, got_it):
+        """Use counts loaded with the post (see app.async_crud) instead of loading the collections."""
+        self._primed_counters = {"likes": likes, "comments": comments, "got_it": got_it}
+
+    def _primed_count(self, name):
+        primed = self.__dict__.get("_primed_counters")
+        return primed[name] if primed is not None else None
+
     @property
     def likes_count(self):
+        primed = self._primed_count("likes")
+        if primed is not None:
+            return primed
         return len(self.likes) if self.likes else 0
 
     @property
     def comments_count(self):
+        primed = self._primed_count("comments")
+        if primed is not None:
+            return primed
         return len(self.comments) if self.comments else 0
 
     @property
     def got_it_count(self):
+        primed = self._primed_count("got_it")
+        if primed is not None:
+            return primed
         return len(self.got_it) if self.got_it else 0
 
     @property
-    def city(self):
-        if not self.address:
-            return None
-        parts = [p.strip() for p in self.address.split(',')]
-        # Remove empty, numeric (zip), and irrelevant parts
-        filtered = [p for p in parts if p and not p.isdigit() and 'county' not in p.lower() and 'united states' not in p.lower()]
-        # State abbreviation mapping
-        state_abbr = {
-            'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'california': 'CA', 'colorado': 'CO',
-            'connecticut': 'CT', 'delaware': 'DE', 'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID',
-            'illinois': 'IL', 'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS', 'kentucky': 'KY', 'louisiana': 'LA',
-            'maine': 'ME', 'maryland': 'MD', 'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN',
-            'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV',
-            'new hampshire': 'NH', 'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY', 'north carolina': 'NC',
-            'north dakota': 'ND', 'ohio': 'OH', 'oklahoma': 'OK', 'oregon': 'OR', 'pennsylvania': 'PA',
-            'rhode island': 'RI', 'south carolina': 'SC', 'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX',
-            'utah': 'UT', 'vermont': 'VT', 'virginia': 'VA', 'washington': 'WA', 'west virginia': 'WV',
-            'wisconsin': 'WI', 'wyoming': 'WY'
-        }
-        city = None
-        state = None
-        for i in range(len(filtered)-1):
-            part = filtered[i]
-            next_part = filtered[i+1]
-            # Heuristic: city is not a state abbreviation, state is 2-letter or full state name
-            if len(next_part) == 2 and next_part.isalpha():
-                city = part
-                state = next_part.upper()
-                break
-            # Or, if state is a full name (e.g., 'Washington')
-            state_lower = next_part.lower()
-            if state_lower in state_abbr:
-                city = part
-                state = state_abbr[state_lower]
-                break
-        if city and state:
-            return f"{city}, {state}"
-        # Fallback: return first non-numeric, non-county part
-        for part in filtered:
-            if not part.isdigit():
-                return part
-        return self.address.strip() 
\ No newline at end of file
+    def city_label(self):
+        if self.city and self.state:
+            return f"{self.city}, {self.state}"
+        return self.city
+
+Index("ix_posts_city_lower", func.lower(Post.city))
+# Partial indexes over active posts only, so the feed, nearby, clustering and
+# expiry queries don't scan gone posts. Queries must filter is_gone == False to use them.
+Index("ix_posts_active_created_at", Post.created_at,
+      sqlite_where=Post.is_gone == False, postgresql_where=Post.is_gone == False)
+Index("ix_posts_active_lat_lng", Post.latitude, Post.longitude,
+      sqlite_where=Post.is_gone == False, postgresql_where=Post.is_gone == False)
+Index("ix_posts_active_expires_at", Post.expires_at,
+      sqlite_where=Post.is_gone == False, postgresql_where=Post.is_gone == False)
@@ -1,8 +1,61 @@
 from sqlalchemy import Column, Integer, String, Float
 from sqlalchemy.orm import relationship, object_session
+from functools import lru_cache
 from app.db import Base
 from app.models.post import Post
 from app.models.interaction import GotIt
+from app.models.archive import ArchivedPost
+
+# Level thresholds and badges
+LEVELS = [
+    {"level": 1, "min_score": 0, "badge": "🌱", "title": "Newcomer"},
+    {"level": 2, "min_score": 5, "badge": "🍃", "title": "Helper"},
+    {"level": 3, "min_score": 15, "badge": "🌿", "title": "Contributor"},
+    {"level": 4, "min_score": 30, "badge": "🌳", "title": "Supporter"},
+    {"level": 5, "min_score": 50, "badge": "🌲", "title": "Community Member"},
+    {"level": 6, "min_score": 75, "badge": "🌴", "title": "Active Helper"},
+    {"level": 7, "min_score": 100, "badge": "🌵", "title": "Generous Soul"},
+    {"level": 8, "min_score": 150, "badge": "🎋", "title": "Sharing Champion"},
+    {"level": 9, "min_score": 200, "badge": "🎍", "title": "Community Hero"},
+    {"level": 10, "min_score": 300, "badge": "🏆", "title": "Freebie Legend"}
+]
+
+@lru_cache(maxsize=1024)
+def _level_info(total_score):
+    # Find current level
+    current_level = LEVELS[0]
+    for level in LEVELS:
+        if total_score >= level["min_score"]:
+            current_level = level
+        else:
+            break
+
+    # Calculate progress to next level
+    next_level = None
+    for level in LEVELS:
+        if level["level"] > current_level["level"]:
+            next_level = level
+            break
+
+    progress = 0
+    if next_level:
+        current_level_score = current_level["min_score"]
+        next_level_score = next_level["min_score"]
+        progress = ((total_score - current_level_score) / (next_level_score - current_level_score)) * 100
+
+    return {
+        "level": current_level["level"],
+        "badge": current_level["badge"],
+        "title": current_level["title"],
+        "total_score": total_score,
+        "progress": min(progress, 100),
+        "next_level": next_level["level"] if next_level else None,
+        "next_title": next_level["title"] if next_level else None
+    }
+
+def compute_level_info(total_score):
+    # Copy so callers can't mutate the cached entry
+    return dict(_level_info(total_score))
 
 class User(Base):
     __tablename__ = "users"
@@ -35,8 +88,16 @@ class User(Base):
     received_messages = relationship("Message", foreign_keys="Message.receiver_id", back_populates="receiver")
     notifications = relationship("Notification", foreign_keys="Notification.user_id", back_populates=None)
 
+    def prime_stats(self, stats):
+        """Use stats loaded in bulk (see app.loaders.UserLoader) instead of querying."""
+        self._primed_stats = stats
+
     @property
     def stats(self):
+        primed = self.__dict__.get("_primed_stats")
+        if primed is not None:
+            return primed
+
         session = object_session(self)
         if not session:
             # If the object is not attached to a session, we can't query.
@@ -44,6 +105,7 @@ class User(Base):
             return {"posts": 0, "got_it": 0, "gave": 0}
 
         posts_count = session.query(Post).filter(Post.owner_id == self.id).count()
+        posts_count += session.query(ArchivedPost).filter(ArchivedPost.owner_id == self.id).count()
         
         got_it_count = session.query(GotIt).filter(GotIt.user_id == self.id).count()
         
@@ -59,49 +121,4 @@ class User(Base):
     @property
     def level_info(self):
         stats = self.stats
-        total_score = stats["posts"] + stats["got_it"] + stats["gave"]
-        
-        # Level thresholds and badges
-        levels = [
-            {"level": 1, "min_score": 0, "badge": "🌱", "title": "Newcomer"},
-            {"level": 2, "min_score": 5, "badge": "🍃", "title": "Helper"},
-            {"level": 3, "min_score": 15, "badge": "🌿", "title": "Contributor"},
-            {"level": 4, "min_score": 30, "badge": "🌳", "title": "Supporter"},
-            {"level": 5, "min_score": 50, "badge": "🌲", "title": "Community Member"},
-            {"level": 6, "min_score": 75, "badge": "🌴", "title": "Active Helper"},
-            {"level": 7, "min_score": 100, "badge": "🌵", "title": "Generous Soul"},
-            {"level": 8, "min_score": 150, "badge": "🎋", "title": "Sharing Champion"},
-            {"level": 9, "min_score": 200, "badge": "🎍", "title": "Community Hero"},
-            {"level": 10, "min_score": 300, "badge": "🏆", "title": "Freebie Legend"}
-        ]
-        
-        # Find current level
-        current_level = levels[0]
-        for level in levels:
-            if total_score >= level["min_score"]:
-                current_level = level
-            else:
-                break
-        
-        # Calculate progress to next level
-        next_level = None
-        for level in levels:
-            if level["level"] > current_level["level"]:
-                next_level = level
-                break
-        
-        progress = 0
-        if next_level:
-            current_level_score = current_level["min_score"]
-            next_level_score = next_level["min_score"]
-            progress = ((total_score - current_level_score) / (next_level_score - current_level_score)) * 100
-        
-        return {
-            "level": current_level["level"],
-            "badge": current_level["badge"],
-            "title": current_level["title"],
-            "total_score": total_score,
-            "progress": min(progress, 100),
-            "next_level": next_level["level"] if next_level else None,
-            "next_title": next_level["title"] if next_level else None
-        } 
\ No newline at end of file
+        return compute_level_info(stats["posts"] + stats["got_it"] + stats["gave"])
@@ -0,0 +1,209 @@
+"""On-demand profiling of individual requests.
+
+An admin (see ADMIN_USERNAMES) asks for a profile with an ``X-Profile``
+header or a ``profile`` query parameter. The value picks the profiler:
+
+* ``cprofile`` (or ``1``): deterministic, written as a pstats ``.prof`` file
+  for ``python -m pstats`` or snakeviz;
+* ``sample``: a thread samples the endpoint's stack every
+  PROFILE_SAMPLE_INTERVAL_MS, written as speedscope JSON
+  (https://www.speedscope.app).
+
+With PROFILE_EVERY_N set, one in N requests of any user is also profiled,
+using PROFILE_MODE. Only the endpoint function is profiled. That is where
+crud calls and lazy ORM loads run. Response serialization is timed
+separately by the metrics ``Server-Timing`` header. Files go to PROFILE_DIR
+and are named after the time, route and user. Their name comes back in the
+``X-Profile`` response header.
+
+One request is profiled at a time per process. While one is running,
+other requests run unprofiled. Async endpoints are profiled on the event loop
+thread, so other requests' code that runs while they await shows up too.
+"""
+import asyncio
+import cProfile
+import functools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from app.config import get_settings
+from app.replicas import current_subject
+
+MODES = {"1": "cprofile", "true": "cprofile", "cprofile": "cprofile", "sample": "sample"}
+
+_lock = threading.Lock()
+
+
+class Sampler:
+    """Samples one thread's stack, below a given frame, from a background thread."""
+
+    def __init__(self, thread_id: int, root, interval: float):
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.frames = {}
+        self.samples = []
+        self.weights = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            stack.append(self.frames.setdefault(key, len(self.frames)))
+            if frame is self.root:
+                break
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self.samples.append(self._stack(frame))
+                self.weights.append((now - last) * 1000)
+            last = now
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def speedscope(self, name: str):
+        frames = [{"name": n, "file": f, "line": line} for (n, f, line) in self.frames]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(self.weights),
+                "samples": self.samples,
+                "weights": self.weights,
+            }],
+            "name": name,
+            "exporter": "freebies",
+        }
+
+
+class Profile:
+    """A requested profile of one request; the endpoint wrapper fills it in."""
+
+    def __init__(self, mode: str, method: str, route: str, user: Optional[str]):
+        self.mode = mode
+        self.method = method
+        self.route = route
+        self.user = user or "anonymous"
+        self.result = None
+
+    @property
+    def filename(self):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", self.route).strip("_") or "root"
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        extension = "prof" if self.mode == "cprofile" else "speedscope.json"
+        return f"{stamp}-{self.method}-{slug}-{re.sub(r'[^A-Za-z0-9_.-]', '_', self.user)}.{extension}"
+
+    def write(self, directory: str):
+        """Write the collected profile; returns the file name, or None if nothing ran."""
+        if self.result is None:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        filename = self.filename
+        path = os.path.join(directory, filename)
+        if self.mode == "cprofile":
+            self.result.dump_stats(path)
+        else:
+            with open(path, "w") as f:
+                json.dump(self.result.speedscope(f"{self.method} {self.route} ({self.user})"), f)
+        return filename
+
+
+current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+
+
+def requested_mode(request) -> Optional[str]:
+    """The profiler this request should run under, or None."""
+    settings = get_settings()
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    if flag is not None:
+        mode = MODES.get(flag.lower())
+        if mode and current_subject.get() in settings.admin_usernames:
+            return mode
+    if settings.PROFILE_EVERY_N > 0 and random.randrange(settings.PROFILE_EVERY_N) == 0:
+        return settings.PROFILE_MODE
+    return None
+
+
+def for_request(request, route: str) -> Optional[Profile]:
+    mode = requested_mode(request)
+    if mode is None:
+        return None
+    return Profile(mode, request.method, route, current_subject.get())
+
+
+def _start(profile: Profile, root):
+    if profile.mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = Sampler(threading.get_ident(), root, get_settings().PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        profiler.start()
+    return profiler
+
+
+def _stop(profile: Profile, profiler):
+    if profile.mode == "cprofile":
+        profiler.disable()
+    else:
+        profiler.stop()
+    profile.result = profiler
+
+
+def profiled(endpoint):
+    """Wrap an endpoint so it runs under the profiler when the request asked for one."""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None or not _lock.acquire(blocking=False):
+                return await endpoint(*args, **kwargs)
+            try:
+                profiler = _start(profile, sys._getframe())
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    _stop(profile, profiler)
+            finally:
+                _lock.release()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None or not _lock.acquire(blocking=False):
+                return endpoint(*args, **kwargs)
+            try:
+                profiler = _start(profile, sys._getframe())
+                try:
+                    return endpoint(*args, **kwargs)
+                finally:
+                    _stop(profile, profiler)
+            finally:
+                _lock.release()
+    return wrapper
@@ -0,0 +1,146 @@
+import enum
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import func, select, union_all, or_
+from sqlalchemy.orm import Session
+from app import geo, crud
+from app.cache import get_cache, get_feed_version
+from app.config import get_settings
+from app.loaders import post_counter_columns
+from app.models.post import Post
+from app.models.follow import Follow
+from app.models.interaction import Like, GotIt, HiddenPost
+
+class FeedSort(enum.Enum):
+    RECENT = "recent"
+    FOR_YOU = "for_you"
+
+# Candidate pool bounds
+CANDIDATE_LIMIT = 500
+CANDIDATE_RADIUS_KM = 25
+CANDIDATE_MAX_AGE_DAYS = 14
+RANKED_FEED_SIZE = 200
+
+# Scoring
+DISTANCE_SCALE_KM = 5  # score falls to ~37% at this distance
+FRESHNESS_HALF_LIFE_HOURS = 24
+WEIGHTS = {
+    "distance": 0.35,
+    "freshness": 0.30,
+    "affinity": 0.15,
+    "engagement": 0.10,
+    "follow": 0.10,
+}
+
+
+def _load_candidates(db: Session, user_id: int, latitude, longitude, radius, category, city, following_only):
+    likes_count, comments_count, got_it_count = post_counter_columns()
+    hidden = select(HiddenPost.post_id).where(HiddenPost.user_id == user_id)
+
+    query = db.query(
+        Post.id, Post.latitude, Post.longitude, Post.category, Post.created_at, Post.owner_id,
+        likes_count, comments_count, got_it_count
+    ).filter(
+        Post.is_gone == False,
+        Post.owner_id != user_id,
+        Post.id.notin_(hidden),
+        Post.created_at >= datetime.utcnow() - timedelta(days=CANDIDATE_MAX_AGE_DAYS)
+    )
+    if latitude is not None and longitude is not None:
+        min_lat, max_lat, lng_ranges = geo.bounding_box(latitude, longitude, radius or CANDIDATE_RADIUS_KM)
+        query = query.filter(Post.latitude.between(min_lat, max_lat)).filter(
+            or_(*(Post.longitude.between(lo, hi) for lo, hi in lng_ranges))
+        )
+    if category:
+        query = query.filter(Post.category == (category.value if hasattr(category, 'value') else category))
+    if city:
+        query = crud.filter_by_city(query, city)
+    if following_only:
+        query = query.filter(Post.owner_id.in_(select(Follow.following_id).where(Follow.follower_id == user_id)))
+    return query.order_by(Post.created_at.desc()).limit(CANDIDATE_LIMIT).all()
+
+
+def _category_affinity(db: Session, user_id: int):
+    """Share of the user's likes and got-its that fall in each category."""
+    liked = select(Post.category).join(Like, Like.post_id == Post.id).where(Like.user_id == user_id)
+    got = select(Post.category).join(GotIt, GotIt.post_id == Post.id).where(GotIt.user_id == user_id)
+    interactions = union_all(liked, got).subquery()
+    rows = db.query(interactions.c.category, func.count()).group_by(interactions.c.category).all()
+    total = sum(count for _, count in rows)
+    return {category: count / total for category, count in rows} if total else {}
+
+
+def _distances_km(latitude, longitude, lats, lngs):
+    lat1, lat2 = np.radians(latitude), np.radians(lats)
+    dlat, dlng = lat2 - lat1, np.radians(lngs - longitude)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * geo.EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def score_candidates(candidates, latitude, longitude, affinity, following_ids, now=None):
+    """Score candidate rows in one vectorized pass; returns an array aligned with candidates."""
+    now = now or datetime.utcnow()
+    ids, lats, lngs, categories, created, owners, likes, comments, got_its = zip(*candidates)
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+
+    if latitude is not None and longitude is not None:
+        distance = np.exp(-_distances_km(latitude, longitude, lats, lngs) / DISTANCE_SCALE_KM)
+    else:
+        distance = np.full(len(ids), 0.5)
+
+    age_hours = (np.datetime64(now, "us") - np.asarray(created, dtype="datetime64[us]")) / np.timedelta64(1, "h")
+    freshness = np.exp2(-np.maximum(age_hours, 0) / FRESHNESS_HALF_LIFE_HOURS)
+
+    category_affinity = np.asarray([affinity.get(c, 0.0) for c in categories])
+
+    activity = np.log1p(np.asarray(likes) + 2 * np.asarray(got_its) + np.asarray(comments))
+    engagement = activity / activity.max() if activity.max() > 0 else activity
+
+    follow = np.isin(np.asarray(owners), list(following_ids)).astype(np.float64) if following_ids else np.zeros(len(ids))
+
+    return (
+        WEIGHTS["distance"] * distance
+        + WEIGHTS["freshness"] * freshness
+        + WEIGHTS["affinity"] * category_affinity
+        + WEIGHTS["engagement"] * engagement
+        + WEIGHTS["follow"] * follow
+    )
+
+
+def rank_feed(db: Session, user_id: int, latitude=None, longitude=None, radius=None, category=None, city=None, following_only=False):
+    """Return up to RANKED_FEED_SIZE post ids for the "for you" feed, best first."""
+    candidates = _load_candidates(db, user_id, latitude, longitude, radius, category, city, following_only)
+    if not candidates:
+        return []
+    affinity = _category_affinity(db, user_id)
+    following_ids = {row[0] for row in db.query(Follow.following_id).filter(Follow.follower_id == user_id).all()}
+    scores = score_candidates(candidates, latitude, longitude, affinity, following_ids)
+
+    k = min(RANKED_FEED_SIZE, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [int(candidates[i][0]) for i in top]
+
+
+def get_ranked_feed(db: Session, user, skip: int = 0, limit: int = 20, latitude=None, longitude=None, radius=None, category=None, city=None, following_only=False):
+    # Fall back to the location saved on the user's profile
+    if latitude is None or longitude is None:
+        latitude, longitude = user.latitude, user.longitude
+    category_value = category.value if hasattr(category, 'value') else category
+    location = f"{latitude:.2f},{longitude:.2f}" if latitude is not None and longitude is not None else "-"
+    key = f"feed:{user.id}:v{get_feed_version(user.id)}:for_you:{location}:{radius}:{category_value}:{city}:{int(following_only)}"
+
+    cache = get_cache()
+    ranked_ids = cache.get(key)
+    if ranked_ids is None:
+        ranked_ids = rank_feed(db, user.id, latitude, longitude, radius, category_value, city, following_only)
+        cache.set(key, ranked_ids, ttl=get_settings().FEED_RANKING_TTL_SECONDS)
+
+    page_ids = ranked_ids[skip:skip + limit]
+    if not page_ids:
+        return []
+    # The ranking may be a little stale; drop posts hidden or reported gone since
+    hidden = crud.get_hidden_post_ids(db, user.id, page_ids)
+    posts = {post.id: post for post in db.query(Post).filter(Post.id.in_(page_ids), Post.is_gone == False).all()}
+    return [posts[post_id] for post_id in page_ids if post_id in posts and post_id not in hidden]
@@ -0,0 +1,191 @@
+"""Routing of read-only requests to replica databases.
+
+Routes that only read take ``get_read_db`` instead of ``get_db``. It hands
+out a session on one of the DATABASE_REPLICA_URLS engines, round-robin, and
+falls back to the primary when:
+
+* the caller committed a write within REPLICA_STICKY_SECONDS, so they read
+  their own writes while the replicas catch up;
+* a replica can't be reached (it is skipped for REPLICA_RETRY_SECONDS);
+* a replica reports more than REPLICA_MAX_LAG_SECONDS of replication lag.
+
+The caller is identified by the JWT subject, which RequestSubjectMiddleware
+puts in a context variable for the duration of the request. Commits of any
+session that wrote something mark that subject as a recent writer in the
+shared cache, so stickiness holds across workers with the Redis backend.
+"""
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+import jwt
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+from app.cache import get_cache
+from app.config import get_settings
+from app.db import SessionLocal, create_db_engine, get_pool_stats
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+current_subject: ContextVar[Optional[str]] = ContextVar("current_subject", default=None)
+
+
+def mark_recent_write(subject: str):
+    get_cache().set(f"recent-write:{subject}", True, ttl=settings.REPLICA_STICKY_SECONDS)
+
+
+def wrote_recently(subject: str) -> bool:
+    return bool(get_cache().get(f"recent-write:{subject}"))
+
+
+@event.listens_for(Session, "after_flush")
+def _flag_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_write_statement(orm_execute_state):
+    # Bulk updates/deletes and insert() statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session):
+    if session.info.pop("wrote", False):
+        subject = current_subject.get()
+        if subject:
+            mark_recent_write(subject)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
+
+def replica_lag_seconds(connection) -> float:
+    """Replication lag as seen by the replica; 0 where the database can't tell."""
+    if connection.dialect.name != "postgresql":
+        return 0.0
+    # NULL on a server that isn't replaying WAL, i.e. not a standby
+    lag = connection.exec_driver_sql(
+        "SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+    ).scalar()
+    return float(lag or 0)
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.engine = create_db_engine(url)
+        self.sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.down_until = 0.0
+        self.lag = 0.0
+        self.lag_checked_at = None
+
+    def status(self):
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "available": self.down_until <= time.monotonic(),
+            "lag_seconds": self.lag,
+            "pool": get_pool_stats(self.engine),
+        }
+
+
+class ReplicaRouter:
+    """Chooses the session a read-only request runs on."""
+
+    def __init__(
+        self,
+        primary: sessionmaker,
+        replica_urls,
+        max_lag_seconds: float = 10,
+        lag_check_seconds: float = 5,
+        retry_seconds: float = 30,
+    ):
+        self.primary = primary
+        self.replicas = [Replica(url) for url in replica_urls]
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_check_seconds = lag_check_seconds
+        self.retry_seconds = retry_seconds
+        self._turn = itertools.count()
+
+    def _open(self, replica: Replica, now: float):
+        session = replica.sessionmaker()
+        try:
+            connection = session.connection()
+            if replica.lag_checked_at is None or now - replica.lag_checked_at >= self.lag_check_seconds:
+                replica.lag = replica_lag_seconds(connection)
+                replica.lag_checked_at = now
+        except DBAPIError:
+            session.close()
+            replica.down_until = now + self.retry_seconds
+            logger.warning("Replica %r unavailable, using other databases for %ss", replica.engine.url, self.retry_seconds)
+            return None
+        if replica.lag > self.max_lag_seconds:
+            session.close()
+            return None
+        return session
+
+    def session_for(self, subject: Optional[str] = None) -> Session:
+        if not self.replicas or (subject and wrote_recently(subject)):
+            return self.primary()
+        now = time.monotonic()
+        start = next(self._turn)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if replica.down_until > now:
+                continue
+            session = self._open(replica, now)
+            if session is not None:
+                return session
+        return self.primary()
+
+    def status(self):
+        return [replica.status() for replica in self.replicas]
+
+
+read_router = ReplicaRouter(
+    SessionLocal,
+    settings.replica_urls,
+    max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+    lag_check_seconds=settings.REPLICA_LAG_CHECK_SECONDS,
+    retry_seconds=settings.REPLICA_RETRY_SECONDS,
+)
+
+
+def get_read_db():
+    db = read_router.session_for(current_subject.get())
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class RequestSubjectMiddleware:
+    """Sets current_subject from the request's bearer token, if it has a valid one."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        subject = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    try:
+                        subject = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get("sub")
+                    except jwt.PyJWTError:
+                        pass
+                break
+        reset = current_subject.set(subject)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_subject.reset(reset)
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
-from app import schemas, crud, utils
+from app import schemas, crud, utils, metrics
 from app.db import get_db
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=metrics.TimedRoute)
 
 @router.post("/signup", response_model=schemas.UserRead)
 def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
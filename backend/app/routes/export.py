@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from app import schemas, crud, utils, export, metrics
+from app.db import get_db
+
+router = APIRouter(prefix="/export", tags=["export"], route_class=metrics.TimedRoute)
+
+
+def export_response(name: str, columns, batches, format: str, gzip: bool):
+    filename = f"{name}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export.encode(columns, batches, format=format, gzip=gzip),
+        media_type="application/gzip" if gzip else export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# Export the current user's data
+@router.get("/me")
+def export_my_data(
+    gzip: bool = False,
+    current_user: schemas.UserRead = Depends(utils.get_current_user)
+):
+    return export_response(f"user-{current_user.id}", None, export.user_export(current_user.id), "ndjson", gzip)
+
+# Export all data about a user (admin only)
+@router.get("/users/{user_id}")
+def export_user_data(
+    user_id: int,
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    admin: schemas.UserRead = Depends(utils.get_admin_user)
+):
+    if not crud.get_user(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    return export_response(f"user-{user_id}", None, export.user_export(user_id), "ndjson", gzip)
+
+# Export a whole table (admin only)
+@router.get("/{kind}")
+def export_table(
+    kind: str,
+    format: str = "ndjson",
+    gzip: bool = False,
+    since: Optional[datetime] = None,
+    admin: schemas.UserRead = Depends(utils.get_admin_user)
+):
+    if kind not in export.TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown export; choose from {', '.join(export.TABLES)}")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    columns, batches = export.table_export(kind, since=since)
+    return export_response(kind, columns, batches, format, gzip)
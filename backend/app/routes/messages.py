@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
-from app import schemas, crud, utils
+from app import schemas, crud, utils, metrics
 from app.db import get_db
+from app.loaders import UserLoader, get_user_loader
 from app.models.message import MessageType
 
-router = APIRouter(prefix="/messages", tags=["messages"])
+router = APIRouter(prefix="/messages", tags=["messages"], route_class=metrics.TimedRoute)
 
 # Get user's inbox
 @router.get("/", response_model=List[schemas.MessageRead])
@@ -15,9 +16,10 @@ def get_inbox(
     message_type: MessageType = None,
     unread_only: bool = False,
     db: Session = Depends(get_db),
-    current_user: schemas.UserRead = Depends(utils.get_current_user)
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
 ):
-    return crud.get_user_messages(
+    messages = crud.get_user_messages(
         db,
         current_user.id,
         skip=skip,
@@ -25,28 +27,31 @@ def get_inbox(
         message_type=message_type,
         unread_only=unread_only
     )
+    return loader.prime_messages(messages)
 
 # Mark message as read
 @router.put("/{message_id}/read", response_model=schemas.MessageRead)
 def mark_message_read(
     message_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.UserRead = Depends(utils.get_current_user)
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
 ):
     message = crud.get_message(db, message_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     if message.receiver_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to read this message")
-    return crud.mark_message_read(db, message_id)
+    return loader.prime_messages([crud.mark_message_read(db, message_id)])[0]
 
 # Mark all messages as read
 @router.put("/read-all", response_model=List[schemas.MessageRead])
 def mark_all_messages_read(
     db: Session = Depends(get_db),
-    current_user: schemas.UserRead = Depends(utils.get_current_user)
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
 ):
-    return crud.mark_all_messages_read(db, current_user.id)
+    return loader.prime_messages(crud.mark_all_messages_read(db, current_user.id))
 
 # Delete message
 @router.delete("/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -69,4 +74,4 @@ def get_unread_count(
     db: Session = Depends(get_db),
     current_user: schemas.UserRead = Depends(utils.get_current_user)
 ):
-    return crud.get_unread_message_count(db, current_user.id) 
\ No newline at end of file
+    return crud.get_unread_message_count(db, current_user.id)
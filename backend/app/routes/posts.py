@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Response, Query, BackgroundTasks
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app import schemas, crud, utils
-from app.db import get_db
+from app import schemas, crud, async_crud, utils, clusters, ranking, archive, metrics, serialization, etags
+from app.db import get_db, get_async_db, SessionLocal
+from app.loaders import UserLoader, get_user_loader, get_read_user_loader
+from app.replicas import get_read_db
+from app.cache import get_post_cache
 from app.models.post import PostCategory, Post
 from app.models.interaction import Comment, Like, GotIt
 import shutil
@@ -12,11 +16,9 @@ from pydantic import ValidationError
 import logging
 from sqlalchemy.sql import func
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/posts", tags=["posts"])
+router = APIRouter(prefix="/posts", tags=["posts"], route_class=metrics.TimedRoute)
 
 # Helper to build absolute URL for photo
 def build_absolute_photo_url(request: Request, photo_url: str) -> str:
@@ -25,10 +27,23 @@ def build_absolute_photo_url(request: Request, photo_url: str) -> str:
     base_url = str(request.base_url).rstrip('/')
     return f"{base_url}/{photo_url}".replace('//', '/')
 
+# Notify users subscribed to the area around a new post
+def notify_area_subscribers(post_id: int):
+    # Runs after the response is sent, so it needs its own session
+    db = SessionLocal()
+    try:
+        post = crud.get_post(db, post_id)
+        if post:
+            notified = crud.notify_area_subscribers(db, post)
+            logger.info("Notified %s area subscribers about post %s", notified, post_id)
+    finally:
+        db.close()
+
 # Create post with photo upload
 @router.post("/", response_model=schemas.PostRead)
 async def create_post(
     request: Request,
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: str = Form(...),
     category: PostCategory = Form(...),
@@ -36,10 +51,10 @@ async def create_post(
     longitude: float = Form(...),
     address: str = Form(...),
     photo: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: schemas.UserRead = Depends(utils.get_current_user)
 ):
-    logger.info(f"Creating post for user: {current_user.username}")
+    logger.debug("Creating post for user %s", current_user.username)
     # Save photo
     photo_path = f"uploads/posts/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{photo.filename}"
     os.makedirs(os.path.dirname(photo_path), exist_ok=True)
@@ -54,7 +69,8 @@ async def create_post(
         address=address,
         photo_url=photo_path
     )
-    post = crud.create_post(db, post_data, current_user.id)
+    post = await async_crud.create_post(db, post_data, current_user.id)
+    background_tasks.add_task(notify_area_subscribers, post.id)
     # Patch photo_url to be absolute
     post.photo_url = build_absolute_photo_url(request, post.photo_url)
     return post
@@ -66,8 +82,12 @@ def search_posts(
     skip: int = 0,
     limit: int = 20,
     category: Optional[str] = None,
-    db: Session = Depends(get_db),
+    city: Optional[str] = None,
+    include_gone: bool = False,
+    db: Session = Depends(get_read_db),
     request: Request = None,
+    current_user: Optional[schemas.UserRead] = Depends(utils.get_current_user_optional),
+    loader: UserLoader = Depends(get_read_user_loader),
 ):
     """Search posts by title or description (case-insensitive partial match)"""
     if not q or len(q.strip()) < 2:
@@ -79,26 +99,123 @@ def search_posts(
         (Post.title.ilike(search_term)) | 
         (Post.description.ilike(search_term))
     )
+
+    if not include_gone:
+        query = query.filter(Post.is_gone == False)
     
     if category:
         query = query.filter(Post.category == category)
     
+    if city:
+        query = crud.filter_by_city(query, city)
+    
     posts = query.offset(skip).limit(limit).all()
+    crud.annotate_viewer_state(db, posts, current_user.id if current_user else None)
     
     # Convert to response format with absolute URLs
     for post in posts:
         post.photo_url = build_absolute_photo_url(request, post.photo_url)
     
-    return posts
+    loader.prime_posts(posts)
+    return serialization.respond(List[schemas.PostRead], posts)
+
+# Get the k closest active posts, paginated by distance
+@router.get("/nearby", response_model=schemas.NearbyPage)
+def get_nearby_posts(
+    request: Request,
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    k: int = Query(20, ge=1, le=100),
+    category: Optional[PostCategory] = None,
+    max_distance: float = Query(crud.NEARBY_MAX_RADIUS_KM, gt=0, le=crud.NEARBY_MAX_RADIUS_KM),  # in kilometers
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_read_user_loader)
+):
+    after = None
+    if cursor:
+        try:
+            distance, post_id = cursor.split(":")
+            after = (float(distance), int(post_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    nearest = crud.get_nearby_posts(
+        db,
+        current_user.id,
+        latitude,
+        longitude,
+        k=k,
+        category=category,
+        after=after,
+        max_radius=max_distance
+    )
+    posts = []
+    for post, distance in nearest:
+        post.distance_km = distance
+        posts.append(post)
+    crud.annotate_viewer_state(db, posts, current_user.id)
+    for post in posts:
+        post.photo_url = build_absolute_photo_url(request, post.photo_url)
+    loader.prime_posts(posts)
+
+    next_cursor = None
+    if len(nearest) == k:
+        last_post, last_distance = nearest[-1]
+        next_cursor = f"{last_distance!r}:{last_post.id}"
+    return serialization.respond(schemas.NearbyPage, {"items": posts, "next_cursor": next_cursor})
+
+# Get grid clusters of active posts for a map viewport
+@router.get("/clusters", response_model=schemas.ClusterPage)
+def get_post_clusters(
+    bbox: str = Query(..., description="min_lng,min_lat,max_lng,max_lat"),
+    zoom: int = Query(..., ge=0, le=clusters.MAX_ZOOM),
+    db: Session = Depends(get_db)
+):
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lng,min_lat,max_lng,max_lat")
+    if not (-180 <= min_lng <= max_lng <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise HTTPException(status_code=400, detail="Invalid bbox")
+
+    try:
+        cells = clusters.get_clusters(db, zoom, min_lat, min_lng, max_lat, max_lng)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"zoom": zoom, "cell_size": clusters.cell_size(zoom), "clusters": cells}
+
+# Get hidden status for several posts at once
+@router.get("/hidden-status", response_model=List[schemas.HiddenStatus])
+def get_posts_hidden_status(
+    post_ids: List[int] = Query(..., max_length=100),
+    db: Session = Depends(get_read_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user)
+):
+    hidden = crud.get_hidden_post_ids(db, user_id=current_user.id, post_ids=post_ids)
+    return [{"post_id": post_id, "is_hidden": post_id in hidden} for post_id in post_ids]
 
 # Get post by ID
 @router.get("/{post_id}", response_model=schemas.PostRead)
-def get_post(post_id: int, request: Request, db: Session = Depends(get_db)):
-    post = crud.get_post(db, post_id)
-    if not post:
+def get_post(post_id: int, request: Request, response: Response, db: Session = Depends(get_db), loader: UserLoader = Depends(get_user_loader)):
+    def load_payload():
+        # Direct links to archived posts still resolve
+        post = crud.get_post(db, post_id) or archive.get_archived_post(db, post_id)
+        if not post:
+            return None
+        loader.prime_posts([post])
+        return schemas.PostRead.model_validate(post, from_attributes=True).model_dump(mode="json")
+
+    # Cached payloads keep the relative photo_url; make it absolute per request
+    payload = get_post_cache().get_or_load(post_id, load_payload)
+    if payload is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    post.photo_url = build_absolute_photo_url(request, post.photo_url)
-    return post
+    etag = etags.weak_etag(payload, str(request.base_url))
+    if etags.client_has(request, etag):
+        return etags.not_modified(etag)
+    etags.tag(response, etag)
+    return serialization.raw({**payload, "photo_url": build_absolute_photo_url(request, payload["photo_url"])}, response=response)
 
 # Get feed with filters
 @router.get("/", response_model=List[schemas.PostRead])
@@ -111,29 +228,51 @@ def get_feed(
     longitude: Optional[float] = None,
     radius: Optional[float] = None,  # in kilometers
     following_only: bool = False,
-    db: Session = Depends(get_db),
-    current_user: schemas.UserRead = Depends(utils.get_current_user)
+    city: Optional[str] = None,  # "City" or "City, ST"
+    sort: ranking.FeedSort = ranking.FeedSort.RECENT,
+    include_gone: bool = False,  # ignored by sort=for_you, which only ranks active posts
+    db: Session = Depends(get_read_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_read_user_loader)
 ):
-    posts = crud.get_feed(
-        db,
-        current_user.id,
-        skip=skip,
-        limit=limit,
-        category=category,
-        latitude=latitude,
-        longitude=longitude,
-        radius=radius,
-        following_only=following_only
-    )
+    if sort == ranking.FeedSort.FOR_YOU:
+        posts = ranking.get_ranked_feed(
+            db,
+            current_user,
+            skip=skip,
+            limit=limit,
+            latitude=latitude,
+            longitude=longitude,
+            radius=radius,
+            category=category,
+            city=city,
+            following_only=following_only
+        )
+    else:
+        posts = crud.get_feed(
+            db,
+            current_user.id,
+            skip=skip,
+            limit=limit,
+            category=category,
+            latitude=latitude,
+            longitude=longitude,
+            radius=radius,
+            following_only=following_only,
+            city=city,
+            include_gone=include_gone
+        )
+    crud.annotate_viewer_state(db, posts, current_user.id)
     for post in posts:
         post.photo_url = build_absolute_photo_url(request, post.photo_url)
-    return posts
+    loader.prime_posts(posts)
+    return serialization.respond(List[schemas.PostRead], posts)
 
 # Update post
 @router.put("/{post_id}", response_model=schemas.PostRead)
 async def update_post(
     post_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: schemas.UserRead = Depends(utils.get_current_user),
     title: Optional[str] = Form(None),
     description: Optional[str] = Form(None),
@@ -144,7 +283,7 @@ async def update_post(
     city: Optional[str] = Form(None),
     photo: Optional[UploadFile] = File(None)
 ):
-    db_post = crud.get_post(db, post_id)
+    db_post = await async_crud.get_post(db, post_id)
     if not db_post:
         raise HTTPException(status_code=404, detail="Post not found")
     if db_post.owner_id != current_user.id:
@@ -174,20 +313,22 @@ async def update_post(
         return db_post # Or raise an exception if no data is provided
 
     post_update_schema = schemas.PostUpdate(**update_data_filtered)
-    return crud.update_post(db, post_id, post_update_schema)
+    return await async_crud.update_post(db, post_id, post_update_schema)
 
 # Delete a post
 @router.delete("/{post_id}", response_model=schemas.PostRead)
 def delete_post(
     post_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.UserRead = Depends(utils.get_current_user)
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
 ):
     post = crud.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     if post.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this post")
+    loader.prime_posts([post])
     crud.delete_post(db, post_id)
     return post
 
@@ -197,13 +338,52 @@ def like_post(
     post_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: schemas.UserRead = Depends(utils.get_current_user)
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
+    post = crud.get_post(db, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    crud.toggle_like(db, post, current_user)
+    crud.annotate_viewer_state(db, [post], current_user.id)
+    post.photo_url = build_absolute_photo_url(request, post.photo_url)
+    loader.prime_posts([post])
+    return post
+
+# Like post (idempotent)
+@router.put("/{post_id}/like", response_model=schemas.PostRead)
+def set_post_like(
+    post_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
+    post = crud.get_post(db, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    crud.set_like(db, post, current_user)
+    crud.annotate_viewer_state(db, [post], current_user.id)
+    post.photo_url = build_absolute_photo_url(request, post.photo_url)
+    loader.prime_posts([post])
+    return post
+
+# Unlike post (idempotent)
+@router.delete("/{post_id}/like", response_model=schemas.PostRead)
+def unset_post_like(
+    post_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
 ):
-    crud.toggle_like(db, post_id, current_user.id)
     post = crud.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
+    crud.unset_like(db, post, current_user)
+    crud.annotate_viewer_state(db, [post], current_user.id)
     post.photo_url = build_absolute_photo_url(request, post.photo_url)
+    loader.prime_posts([post])
     return post
 
 # Comment on post
@@ -212,9 +392,12 @@ def comment_post(
     post_id: int,
     comment: schemas.CommentCreate,
     db: Session = Depends(get_db),
-    current_user: schemas.UserRead = Depends(utils.get_current_user)
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
 ):
-    return crud.create_comment(db, post_id, current_user.id, comment)
+    if not crud.get_post(db, post_id):
+        raise HTTPException(status_code=404, detail="Post not found")
+    return loader.prime_comments([crud.create_comment(db, post_id, current_user.id, comment)])[0]
 
 # Mark post as "Got it"
 @router.post("/{post_id}/got-it", response_model=schemas.PostRead)
@@ -222,38 +405,77 @@ def got_it_post(
     post_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: schemas.UserRead = Depends(utils.get_current_user)
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
 ):
-    crud.toggle_got_it(db, post_id, current_user.id)
     post = crud.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
+    crud.toggle_got_it(db, post, current_user)
+    crud.annotate_viewer_state(db, [post], current_user.id)
     post.photo_url = build_absolute_photo_url(request, post.photo_url)
+    loader.prime_posts([post])
+    return post
+
+# Mark post as "Got it" (idempotent)
+@router.put("/{post_id}/got-it", response_model=schemas.PostRead)
+def set_post_got_it(
+    post_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
+    post = crud.get_post(db, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    crud.set_got_it(db, post, current_user)
+    crud.annotate_viewer_state(db, [post], current_user.id)
+    post.photo_url = build_absolute_photo_url(request, post.photo_url)
+    loader.prime_posts([post])
+    return post
+
+# Undo "Got it" (idempotent)
+@router.delete("/{post_id}/got-it", response_model=schemas.PostRead)
+def unset_post_got_it(
+    post_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
+    post = crud.get_post(db, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    crud.unset_got_it(db, post, current_user)
+    crud.annotate_viewer_state(db, [post], current_user.id)
+    post.photo_url = build_absolute_photo_url(request, post.photo_url)
+    loader.prime_posts([post])
     return post
 
 # Get users who liked a post
 @router.get("/{post_id}/likes", response_model=List[schemas.UserRead])
-def get_post_likes(post_id: int, db: Session = Depends(get_db)):
+def get_post_likes(post_id: int, db: Session = Depends(get_read_db), loader: UserLoader = Depends(get_read_user_loader)):
     post = crud.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    return [like.user for like in post.likes]
+    return serialization.respond(List[schemas.UserRead], loader.prime_users([like.user for like in post.likes]))
 
 # Get users who got it for a post
 @router.get("/{post_id}/got-it", response_model=List[schemas.UserRead])
-def get_post_got_it(post_id: int, db: Session = Depends(get_db)):
+def get_post_got_it(post_id: int, db: Session = Depends(get_read_db), loader: UserLoader = Depends(get_read_user_loader)):
     post = crud.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    return [got_it.user for got_it in post.got_it]
+    return serialization.respond(List[schemas.UserRead], loader.prime_users([got_it.user for got_it in post.got_it]))
 
 # Get comments for a post
 @router.get("/{post_id}/comments", response_model=List[schemas.CommentRead])
-def get_post_comments(post_id: int, db: Session = Depends(get_db)):
+def get_post_comments(post_id: int, db: Session = Depends(get_read_db), loader: UserLoader = Depends(get_read_user_loader)):
     post = crud.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    return post.comments
+    return serialization.respond(List[schemas.CommentRead], loader.prime_comments(post.comments))
 
 # Delete a comment
 @router.delete("/comments/{comment_id}")
@@ -311,10 +533,10 @@ async def report_post_as_gone(
     latitude: float = Form(...),
     longitude: float = Form(...),
     photo: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: schemas.UserRead = Depends(utils.get_current_user)
 ):
-    post = crud.get_post(db, post_id)
+    post = await async_crud.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
@@ -340,5 +562,4 @@ async def report_post_as_gone(
         is_gone=True
     )
     
-    updated_post = crud.update_post(db, post_id, update_data)
-    return updated_post 
\ No newline at end of file
+    return await async_crud.update_post(db, post_id, update_data)
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+from app import schemas, crud, utils, metrics
+from app.db import get_db
+
+router = APIRouter(prefix="/subscriptions", tags=["subscriptions"], route_class=metrics.TimedRoute)
+
+# Subscribe to new posts in an area
+@router.post("/", response_model=schemas.AreaSubscriptionRead)
+def create_subscription(
+    subscription: schemas.AreaSubscriptionCreate,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user)
+):
+    return crud.create_area_subscription(db, current_user.id, subscription)
+
+# List the current user's area subscriptions
+@router.get("/", response_model=List[schemas.AreaSubscriptionRead])
+def get_subscriptions(
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user)
+):
+    return crud.get_area_subscriptions(db, current_user.id)
+
+# Remove an area subscription
+@router.delete("/{subscription_id}", status_code=status.HTTP_200_OK)
+def delete_subscription(
+    subscription_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user)
+):
+    if not crud.delete_area_subscription(db, subscription_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return {"message": "Subscription deleted"}
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app import schemas, crud, utils, metrics
+from app.db import get_db
+
+router = APIRouter(prefix="/sync", tags=["sync"], route_class=metrics.TimedRoute)
+
+# Replay a batch of offline interactions
+@router.post("/", response_model=schemas.SyncResponse)
+def sync_interactions(
+    sync_request: schemas.SyncRequest,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user)
+):
+    results, post_ids, user_ids = crud.apply_sync_operations(db, current_user, sync_request.operations)
+    return {
+        "results": results,
+        "posts": crud.get_post_counters(db, post_ids) if post_ids else [],
+        "users": crud.get_user_follow_counters(db, user_ids) if user_ids else [],
+    }
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Form
-from sqlalchemy.orm import Session
-from typing import List
-from app import schemas, crud, utils
-from app.db import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response, Form
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app import schemas, crud, async_crud, utils, metrics, serialization, etags
+from app.db import get_db, get_async_db
+from app.loaders import UserLoader, get_user_loader, get_read_user_loader
+from app.replicas import get_read_db
 import shutil
 import os
 from datetime import datetime
@@ -11,19 +14,15 @@ from app.models.interaction import Notification
 from app.schemas import NotificationRead
 from app.models.user import User
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=metrics.TimedRoute)
 
 # Helper to build absolute URL for photo
 def build_absolute_photo_url(request: Request, photo_url: str) -> str:
-    logger.info(f"Building absolute URL for: {photo_url}")
     if not photo_url:
         return None
     if photo_url.startswith('http'):
-        logger.info(f"URL already absolute: {photo_url}")
         return photo_url
 
     # Ensure the URL starts with uploads/
@@ -40,46 +39,40 @@ def build_absolute_photo_url(request: Request, photo_url: str) -> str:
     
     absolute_url = f"{base_url}/{photo_url}"
     
-    logger.info(f"Built absolute URL: {absolute_url}")
-    logger.info(f"From base_url: {base_url}")
-    logger.info(f"And photo_url: {photo_url}")
+    logger.debug("Built absolute URL %s from %s", absolute_url, photo_url)
     return absolute_url
 
+def user_profile_response(request: Request, user, response: Response = None):
+    """UserProfile of a user whose stats are primed, with an absolute picture URL."""
+    profile = schemas.UserProfile.model_validate(user, from_attributes=True)
+    profile.profile_picture_url = build_absolute_photo_url(request, profile.profile_picture_url)
+    return serialization.respond(schemas.UserProfile, profile, response=response)
+
+def user_profile_etag(request: Request, user):
+    # The user's row and stats (which level_info derives from) determine the profile
+    return etags.weak_etag(etags.row_version(user), user.stats, str(request.base_url))
+
 # Get current user profile
 @router.get("/me", response_model=schemas.UserProfile)
 def get_current_user_profile(
     request: Request,
+    response: Response,
     current_user: schemas.UserRead = Depends(utils.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    loader: UserLoader = Depends(get_user_loader)
 ):
-    logger.info("="*50)
-    logger.info("GET /users/me endpoint called")
-    logger.info(f"Request base URL: {request.base_url}")
-    
     # Get the full user object to access the stats property
     user = crud.get_user(db, current_user.id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get the stats explicitly
-    user_stats = user.stats
-    logger.info(f"User stats: {user_stats}")
-    
-    user_dict = current_user.dict()
-    logger.info(f"Original profile_picture_url: {user_dict.get('profile_picture_url')}")
-    if user_dict.get("profile_picture_url"):
-        absolute_url = build_absolute_photo_url(request, user_dict["profile_picture_url"])
-        logger.info(f"Converted to absolute URL: {absolute_url}")
-        user_dict["profile_picture_url"] = absolute_url
-    
-    # Add stats to the response
-    user_dict["stats"] = user_stats
-    
-    # Add level info to the response
-    user_dict["level_info"] = user.level_info
-    
-    logger.info("="*50)
-    return user_dict
+    loader.prime_users([user])
+    logger.debug("User %s stats: %s", user.id, user.stats)
+    etag = user_profile_etag(request, user)
+    if etags.client_has(request, etag):
+        return etags.not_modified(etag)
+    etags.tag(response, etag)
+    return user_profile_response(request, user, response)
 
 # Update current user profile
 @router.put("/me", response_model=schemas.UserProfile)
@@ -90,14 +83,10 @@ async def update_current_user_profile(
     latitude: float = Form(default=None),
     longitude: float = Form(default=None),
     profile_picture: UploadFile = File(default=None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: schemas.UserRead = Depends(utils.get_current_user)
 ):
     try:
-        logger.info("="*50)
-        logger.info("PUT /users/me endpoint called")
-        logger.info(f"Received display_name: {display_name}")
-        
         update_data = {}
         
         # Handle display name
@@ -105,7 +94,6 @@ async def update_current_user_profile(
             display_name = display_name.strip()
             if len(display_name) > 0:  # Only update if non-empty
                 update_data["display_name"] = display_name
-            logger.info(f"Processed display_name: {display_name}")
         
         # Handle other fields
         if bio is not None:
@@ -128,76 +116,50 @@ async def update_current_user_profile(
                 
                 # Store the path with uploads prefix
                 update_data["profile_picture_url"] = f"uploads/{photo_path}"
-                logger.info(f"Saved profile picture to: {full_path}")
-            except Exception as e:
-                logger.error(f"Error saving profile picture: {str(e)}")
+                logger.debug("Saved profile picture to %s", full_path)
+            except Exception:
+                logger.exception("Error saving profile picture")
                 raise HTTPException(status_code=500, detail="Failed to save profile picture")
         
-        logger.info(f"Update data: {update_data}")
+        logger.debug("Updating user %s fields %s", current_user.id, sorted(update_data))
         
         # Update the user
         try:
-            updated_user = crud.update_user(db, current_user.id, update_data)
-            logger.info(f"User updated successfully: {updated_user.id}")
-        except Exception as e:
-            logger.error(f"Error updating user in database: {str(e)}")
+            updated_user = await async_crud.update_user(db, current_user.id, update_data)
+        except Exception:
+            logger.exception("Error updating user %s in database", current_user.id)
             raise HTTPException(status_code=500, detail="Failed to update user in database")
         
-        # Convert to dict and handle profile picture URL
         try:
-            user_dict = updated_user.__dict__.copy()
-            if user_dict.get("profile_picture_url"):
-                user_dict["profile_picture_url"] = build_absolute_photo_url(request, user_dict["profile_picture_url"])
-            
-            # Add stats to response
-            user_dict["stats"] = updated_user.stats
-            
-            # Add level info to the response
-            user_dict["level_info"] = updated_user.level_info
-            
-            logger.info(f"Final response data: {user_dict}")
-            logger.info("="*50)
-            
-            return user_dict
-        except Exception as e:
-            logger.error(f"Error preparing response: {str(e)}")
+            return user_profile_response(request, updated_user)
+        except Exception:
+            logger.exception("Error preparing profile response")
             raise HTTPException(status_code=500, detail="Failed to prepare response")
             
     except HTTPException:
         raise
-    except Exception as e:
-        logger.error(f"Unexpected error in update_current_user_profile: {str(e)}")
+    except Exception:
+        logger.exception("Unexpected error in update_current_user_profile")
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
 
 # Add new endpoint for user lookup by username
 @router.get("/lookup", response_model=schemas.UserProfile)
-def lookup_user_by_username(username: str, db: Session = Depends(get_db), request: Request = None):
+def lookup_user_by_username(username: str, db: Session = Depends(get_read_db), request: Request = None, loader: UserLoader = Depends(get_read_user_loader)):
     user = crud.get_user_by_username(db, username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get the stats explicitly
-    user_stats = user.stats
-    
-    user_dict = user.__dict__.copy()
-    if user_dict.get("profile_picture_url"):
-        user_dict["profile_picture_url"] = build_absolute_photo_url(request, user_dict["profile_picture_url"])
-    
-    # Add stats to the response
-    user_dict["stats"] = user_stats
-    
-    # Add level info to the response
-    user_dict["level_info"] = user.level_info
-    
-    return user_dict
+    loader.prime_users([user])
+    return user_profile_response(request, user)
 
 # Add new endpoint for user search
 @router.get("/search", response_model=List[schemas.UserRead])
 def search_users(
     q: str, 
     limit: int = 10, 
-    db: Session = Depends(get_db), 
-    request: Request = None
+    db: Session = Depends(get_read_db), 
+    request: Request = None,
+    loader: UserLoader = Depends(get_read_user_loader)
 ):
     """Search users by username or display name (case-insensitive partial match)"""
     if not q or len(q.strip()) < 2:
@@ -210,53 +172,35 @@ def search_users(
         (User.username.ilike(search_term)) | 
         (User.display_name.ilike(search_term))
     ).limit(limit).all()
+    loader.prime_users(users)
     
     # Convert to response format with absolute URLs
-    results = []
-    for user in users:
-        user_dict = user.__dict__.copy()
-        if user_dict.get("profile_picture_url"):
-            user_dict["profile_picture_url"] = build_absolute_photo_url(request, user_dict["profile_picture_url"])
-        results.append(user_dict)
+    results = serialization.adapter(List[schemas.UserRead]).validate_python(users, from_attributes=True)
+    for result in results:
+        result.profile_picture_url = build_absolute_photo_url(request, result.profile_picture_url)
     
-    return results
+    return serialization.respond(List[schemas.UserRead], results)
 
 # Get user profile by ID
 @router.get("/{user_id}", response_model=schemas.UserProfile)
 def get_user_profile(
     user_id: int,
-    db: Session = Depends(get_db),
-    request: Request = None
+    response: Response,
+    db: Session = Depends(get_read_db),
+    request: Request = None,
+    loader: UserLoader = Depends(get_read_user_loader)
 ):
-    logger.info("="*50)
-    logger.info(f"GET /users/{user_id} endpoint called")
     user = crud.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Get the stats explicitly
-    user_stats = user.stats
-    logger.info(f"User stats: {user_stats}")
-
-    # Manually construct the response to match UserProfile schema
-    user_profile = schemas.UserProfile(
-        id=user.id,
-        username=user.username,
-        email=user.email,
-        bio=user.bio,
-        profile_picture_url=build_absolute_photo_url(request, user.profile_picture_url),
-        latitude=user.latitude,
-        longitude=user.longitude,
-        display_name=user.display_name,
-        stats=user_stats  # Explicitly include the stats
-    )
-    
-    # Add level info to the response
-    user_profile.level_info = user.level_info
-    
-    logger.info(f"Returning user profile for user_id: {user_id}")
-    logger.info("="*50)
-    return user_profile
+    loader.prime_users([user])
+    logger.debug("User %s stats: %s", user_id, user.stats)
+    etag = user_profile_etag(request, user)
+    if etags.client_has(request, etag):
+        return etags.not_modified(etag)
+    etags.tag(response, etag)
+    return user_profile_response(request, user, response)
 
 # Follow/Unfollow user
 @router.post("/{user_id}/follow", status_code=status.HTTP_200_OK)
@@ -265,12 +209,13 @@ def follow_user(
     db: Session = Depends(get_db),
     current_user: schemas.UserRead = Depends(utils.get_current_user)
 ):
-    logger.info(f"User {current_user.username} attempting to follow/unfollow user ID: {user_id}")
+    logger.debug("User %s toggling follow of user %s", current_user.username, user_id)
     if user_id == current_user.id:
-        logger.warning(f"User {current_user.username} attempted to follow themselves")
         raise HTTPException(status_code=400, detail="Cannot follow yourself")
+    if not crud.user_exists(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
     
-    result = crud.toggle_follow(db, current_user.id, user_id)
+    result = crud.toggle_follow(db, current_user, user_id)
     
     if result:
         # Successfully followed
@@ -279,15 +224,41 @@ def follow_user(
         # Successfully unfollowed
         return {"status": "unfollowed"}
 
+# Follow user (idempotent)
+@router.put("/{user_id}/follow", status_code=status.HTTP_200_OK)
+def set_follow_user(
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user)
+):
+    if user_id == current_user.id:
+        raise HTTPException(status_code=400, detail="Cannot follow yourself")
+    if not crud.user_exists(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    crud.set_follow(db, current_user, user_id)
+    return {"status": "followed"}
+
+# Unfollow user (idempotent)
+@router.delete("/{user_id}/follow", status_code=status.HTTP_200_OK)
+def unset_follow_user(
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(utils.get_current_user)
+):
+    crud.unset_follow(db, current_user, user_id)
+    return {"status": "unfollowed"}
+
 # Get user's followers
 @router.get("/{user_id}/followers", response_model=List[schemas.UserRead])
 def get_user_followers(
     user_id: int,
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    loader: UserLoader = Depends(get_read_user_loader)
 ):
-    return crud.get_user_followers(db, user_id, skip=skip, limit=limit)
+    followers = loader.prime_users(crud.get_user_followers(db, user_id, skip=skip, limit=limit))
+    return serialization.respond(List[schemas.UserRead], followers)
 
 # Get user's following
 @router.get("/{user_id}/following", response_model=List[schemas.UserRead])
@@ -295,9 +266,11 @@ def get_user_following(
     user_id: int,
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    loader: UserLoader = Depends(get_read_user_loader)
 ):
-    return crud.get_user_following(db, user_id, skip=skip, limit=limit)
+    following = loader.prime_users(crud.get_user_following(db, user_id, skip=skip, limit=limit))
+    return serialization.respond(List[schemas.UserRead], following)
 
 # Get user's posts
 @router.get("/{user_id}/posts", response_model=List[schemas.PostRead])
@@ -305,21 +278,26 @@ def get_user_posts(
     user_id: int,
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db),
-    request: Request = None
+    db: Session = Depends(get_read_db),
+    request: Request = None,
+    current_user: Optional[schemas.UserRead] = Depends(utils.get_current_user_optional),
+    loader: UserLoader = Depends(get_read_user_loader)
 ):
     posts = crud.get_user_posts(db, user_id, skip=skip, limit=limit)
+    crud.annotate_viewer_state(db, posts, current_user.id if current_user else None)
     for post in posts:
         post.photo_url = build_absolute_photo_url(request, post.photo_url)
-    return posts
+    loader.prime_posts(posts)
+    return serialization.respond(List[schemas.PostRead], posts)
 
 # Get user's stats
 @router.get("/{user_id}/stats", response_model=schemas.UserStats)
 def get_user_stats(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    loader: UserLoader = Depends(get_read_user_loader)
 ):
-    user = crud.get_user(db, user_id)
+    user = loader.load(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user.stats
@@ -327,24 +305,32 @@ def get_user_stats(
 # Get notifications for current user
 @router.get("/notifications/", response_model=List[NotificationRead])
 def get_notifications(
-    db: Session = Depends(get_db),
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: schemas.UserRead = Depends(utils.get_current_user),
-    request: Request = None
+    request: Request = None,
+    loader: UserLoader = Depends(get_read_user_loader)
 ):
-    notifs = db.query(Notification).filter(Notification.user_id == current_user.id).order_by(Notification.created_at.desc()).all()
-    # Eager load post and actor, and patch post.photo_url to absolute
+    # New, deleted, newly read or edited-post notifications change the version; counts on
+    # the embedded posts may lag until one of those happens (it's a weak ETag)
+    etag = etags.weak_etag(crud.get_notifications_version(db, current_user.id), str(request.base_url))
+    if etags.client_has(request, etag):
+        return etags.not_modified(etag)
+    etags.tag(response, etag)
+
+    notifs = db.query(Notification).options(
+        selectinload(Notification.post)
+    ).filter(Notification.user_id == current_user.id).order_by(Notification.created_at.desc()).all()
+    # Load actors and post owners in one batch, and patch post.photo_url to absolute
+    loader.prime_notifications(notifs)
     for n in notifs:
-        # Eagerly load related objects to avoid separate queries
-        _ = n.actor
-        if n.post:
-            _ = n.post
-            if n.post.photo_url:
-                n.post.photo_url = build_absolute_photo_url(request, n.post.photo_url)
-    return notifs
+        if n.post and n.post.photo_url:
+            n.post.photo_url = build_absolute_photo_url(request, n.post.photo_url)
+    return serialization.respond(List[NotificationRead], notifs, response=response)
 
 @router.get("/notifications/unread-count", response_model=int)
 def get_unread_notifications_count(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: schemas.UserRead = Depends(utils.get_current_user)
 ):
     """Get the count of unread notifications for the current user."""
@@ -358,7 +344,8 @@ def get_unread_notifications_count(
 def mark_notification_as_read(
     notification_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.UserRead = Depends(utils.get_current_user)
+    current_user: schemas.UserRead = Depends(utils.get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
 ):
     notification = db.query(Notification).filter(Notification.id == notification_id).first()
     if not notification:
@@ -367,7 +354,7 @@ def mark_notification_as_read(
         raise HTTPException(status_code=403, detail="You are not authorized to mark this notification as read")
     notification.is_read = True
     db.commit()
-    return notification
+    return loader.prime_notifications([notification])[0]
 
 @router.put("/notifications/read-all", status_code=status.HTTP_204_NO_CONTENT)
 def mark_all_notifications_read(
@@ -376,4 +363,4 @@ def mark_all_notifications_read(
 ):
     """Mark all notifications for the current user as read."""
     crud.mark_all_notifications_as_read(db, current_user.id)
-    return 
\ No newline at end of file
+    return 
@@ -1,8 +1,9 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, Field, AliasChoices
+from typing import List, Optional, Dict
 from datetime import datetime
 from app.models.post import PostCategory
 from app.models.message import MessageType
+from app.models.interaction import SyncAction
 
 # User schemas
 class UserBase(BaseModel):
@@ -77,7 +78,52 @@ class PostRead(PostBase):
     comments_count: int
     got_it_count: int
     is_gone: bool
-    city: Optional[str] = None
+    expires_at: Optional[datetime] = None
+    # "City, ST" label, read from Post.city_label (or "city" when validating a dict)
+    city: Optional[str] = Field(default=None, validation_alias=AliasChoices("city_label", "city"))
+    state: Optional[str] = None
+    liked_by_me: bool = False
+    got_it_by_me: bool = False
+    hidden_by_me: bool = False
+
+    class Config:
+        orm_mode = True
+
+class NearbyPost(PostRead):
+    distance_km: float
+
+class NearbyPage(BaseModel):
+    items: List[NearbyPost]
+    next_cursor: Optional[str] = None
+
+class PostCluster(BaseModel):
+    cell_x: int
+    cell_y: int
+    count: int
+    latitude: float  # centroid of the posts in the cell
+    longitude: float
+    categories: Dict[str, int]
+    post_id: Optional[int] = None  # set when the cell holds a single post
+
+class ClusterPage(BaseModel):
+    zoom: int
+    cell_size: float  # in degrees
+    clusters: List[PostCluster]
+
+# Area subscription schemas
+class AreaSubscriptionCreate(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    radius_km: float = Field(..., gt=0, le=50)
+    category: Optional[PostCategory] = None
+
+class AreaSubscriptionRead(BaseModel):
+    id: int
+    latitude: float
+    longitude: float
+    radius_km: float
+    category: Optional[str] = None
+    created_at: datetime
 
     class Config:
         orm_mode = True
@@ -183,9 +229,46 @@ class HiddenPost(BaseModel):
     user_id: int
     post_id: int
 
+class HiddenStatus(BaseModel):
+    post_id: int
+    is_hidden: bool
+
 class HiddenPostRead(HiddenPost):
     id: int
     created_at: datetime
 
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True
+
+# Offline sync schemas
+class SyncOperation(BaseModel):
+    idempotency_key: str = Field(..., min_length=1, max_length=128)
+    action: SyncAction
+    target_id: int
+
+class SyncRequest(BaseModel):
+    operations: List[SyncOperation] = Field(..., max_length=200)
+
+class SyncOperationResult(BaseModel):
+    idempotency_key: str
+    action: SyncAction
+    target_id: int
+    status: str  # "applied", "duplicate" or "error"
+    state: Optional[bool] = None
+    detail: Optional[str] = None
+
+class PostCounters(BaseModel):
+    post_id: int
+    likes_count: int
+    comments_count: int
+    got_it_count: int
+
+class UserCounters(BaseModel):
+    user_id: int
+    followers_count: int
+    following_count: int
+
+class SyncResponse(BaseModel):
+    results: List[SyncOperationResult]
+    posts: List[PostCounters]
+    users: List[UserCounters]
@@ -0,0 +1,59 @@
+"""Fast JSON responses for routes that opt in.
+
+FastAPI validates a returned value against ``response_model``. It then
+serializes it to Python primitives and encodes those with the stdlib
+``json`` module. Routes that return large lists can skip those passes:
+
+    return serialization.respond(List[schemas.PostRead], posts)
+
+This validates ORM objects (or dicts or model instances) once, with a
+cached TypeAdapter, and pydantic-core writes the JSON bytes directly.
+``raw`` encodes data that is already in response shape, such as cached
+payloads, without validating it again. Pass the route's injected
+``Response`` as ``response=`` to keep headers set on it. Keep
+``response_model`` on the route, since it still documents the response in
+OpenAPI.
+
+With FAST_SERIALIZATION=false both return the value unchanged, so responses
+go through FastAPI's path. This is useful for comparing the two.
+"""
+from functools import lru_cache
+
+import pydantic_core
+from fastapi import Response
+from pydantic import TypeAdapter
+from app import metrics
+from app.config import get_settings
+
+
+class JSONBytesResponse(Response):
+    media_type = "application/json"
+
+
+@lru_cache(maxsize=None)
+def adapter(response_type) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def _send(body: bytes, status_code: int, response: Response = None):
+    sent = JSONBytesResponse(body, status_code=status_code)
+    if response is not None:
+        # Keep headers set on the route's injected Response, as FastAPI does for returned values
+        sent.headers.raw.extend(response.headers.raw)
+    return sent
+
+
+def respond(response_type, value, status_code: int = 200, response: Response = None):
+    if not get_settings().FAST_SERIALIZATION:
+        return value
+    with metrics.serializing():
+        type_adapter = adapter(response_type)
+        validated = type_adapter.validate_python(value, from_attributes=True)
+        return _send(type_adapter.dump_json(validated), status_code, response)
+
+
+def raw(payload, status_code: int = 200, response: Response = None):
+    if not get_settings().FAST_SERIALIZATION:
+        return payload
+    with metrics.serializing():
+        return _send(pydantic_core.to_json(payload), status_code, response)
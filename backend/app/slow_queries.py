@@ -0,0 +1,206 @@
+"""Slow statement log with captured query plans.
+
+``install`` hooks every engine. A statement that takes SLOW_QUERY_MS or
+longer is written as one JSON line to SLOW_QUERY_LOG (rotated at
+SLOW_QUERY_LOG_MAX_BYTES) by a background thread. The record holds the SQL,
+its normalized form, the shape of its bind parameters (types only, never
+values), the duration, and the app function that issued it. SELECTs also get their plan, from
+EXPLAIN on Postgres or EXPLAIN QUERY PLAN on SQLite. A plan is captured at
+most once per normalized statement every EXPLAIN_INTERVAL_SECONDS.
+
+``summarize`` groups a log by normalized statement for ``run.py slow-queries``.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import get_settings
+from app.log import queued
+
+EXPLAIN_INTERVAL_SECONDS = 600
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger("freebies.slow_queries")
+_explained = {}
+_explained_lock = threading.Lock()
+
+
+def normalize(statement: str) -> str:
+    """Collapse whitespace, literals and variable-length IN lists so equivalent statements group together."""
+    statement = re.sub(r"\s+", " ", statement).strip()
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    # Leave numbered placeholders ($1) alone for the IN-list pattern below
+    statement = re.sub(r"(?<!\$)\b\d+(\.\d+)?\b", "?", statement)
+    # Expanding IN produces one placeholder per value
+    statement = re.sub(r"\(\s*(?:\?|%\(\w+\)s|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+))*\s*\)", "(...)", statement)
+    return statement
+
+
+def parameter_shape(parameters, executemany: bool):
+    def shape(params):
+        if isinstance(params, dict):
+            return {key: type(value).__name__ for key, value in params.items()}
+        return [type(value).__name__ for value in params or ()]
+
+    if executemany:
+        return {"rows": len(parameters), "row": shape(parameters[0]) if parameters else None}
+    return shape(parameters)
+
+
+def calling_function():
+    """module.function:line of the innermost app frame outside this module, e.g. crud.get_feed:181."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename != __file__:
+            module = os.path.relpath(filename, APP_DIR)[:-3].replace(os.sep, ".")
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return None
+
+
+def _should_explain(fingerprint: str) -> bool:
+    now = time.monotonic()
+    with _explained_lock:
+        if now - _explained.get(fingerprint, -EXPLAIN_INTERVAL_SECONDS) < EXPLAIN_INTERVAL_SECONDS:
+            return False
+        if len(_explained) > 10000:
+            _explained.clear()
+        _explained[fingerprint] = now
+        return True
+
+
+def explain(conn, statement: str, parameters):
+    """The statement's plan as rows of text, run on the raw DBAPI connection so it isn't logged itself."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        return None
+    # This runs inside the request's transaction. On Postgres a failed EXPLAIN
+    # would abort it, so the EXPLAIN runs in a savepoint that is rolled back on error.
+    savepoint = dialect == "postgresql"
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        finally:
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+    if dialect == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[3] for row in rows]
+    return [row[0] for row in rows]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._slow_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not hasattr(context, "_slow_query_start"):
+        return
+    duration_ms = (time.perf_counter() - context._slow_query_start) * 1000
+    settings = get_settings()
+    if duration_ms < settings.SLOW_QUERY_MS:
+        return
+    fingerprint = normalize(statement)
+    record = {
+        "ts": datetime.utcnow().isoformat(),
+        "duration_ms": round(duration_ms, 2),
+        "database": conn.engine.url.database,
+        "caller": calling_function(),
+        "fingerprint": fingerprint,
+        "statement": statement,
+        "parameters": parameter_shape(parameters, executemany),
+    }
+    is_select = fingerprint.split(" ", 1)[0].upper() in ("SELECT", "WITH")
+    if settings.SLOW_QUERY_EXPLAIN and is_select and not executemany and _should_explain(fingerprint):
+        try:
+            record["plan"] = explain(conn, statement, parameters)
+        except Exception as e:
+            record["plan_error"] = str(e)
+    logger.warning(json.dumps(record))
+
+
+def install():
+    """Start logging slow statements of every engine; a no-op when SLOW_QUERY_MS is 0."""
+    settings = get_settings()
+    if settings.SLOW_QUERY_MS <= 0 or event.contains(Engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    directory = os.path.dirname(settings.SLOW_QUERY_LOG)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = RotatingFileHandler(
+        settings.SLOW_QUERY_LOG,
+        maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+        delay=True,
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(queued(handler))
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def read_log(path: str):
+    """Records from a log and its rotated backups, oldest file first."""
+    backups = [p for p in glob.glob(f"{glob.escape(path)}.*") if p.rsplit(".", 1)[1].isdigit()]
+    # RotatingFileHandler keeps the oldest in the highest-numbered backup
+    backups.sort(key=lambda p: int(p.rsplit(".", 1)[1]), reverse=True)
+    for log_path in backups + [path]:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def summarize(records, sort: str = "total"):
+    """Group records by fingerprint: count, total/mean/max ms, callers and the slowest example's plan."""
+    groups = {}
+    for record in records:
+        group = groups.setdefault(record["fingerprint"], {
+            "fingerprint": record["fingerprint"], "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+            "callers": set(), "plan": None, "example": None,
+        })
+        group["count"] += 1
+        group["total_ms"] += record["duration_ms"]
+        if record.get("caller"):
+            group["callers"].add(record["caller"])
+        if record.get("plan"):
+            group["plan"] = record["plan"]
+        if record["duration_ms"] >= group["max_ms"]:
+            group["max_ms"] = record["duration_ms"]
+            group["example"] = record
+    for group in groups.values():
+        group["mean_ms"] = group["total_ms"] / group["count"]
+        group["callers"] = sorted(group["callers"])
+    key = {"total": "total_ms", "count": "count", "max": "max_ms", "mean": "mean_ms"}[sort]
+    return sorted(groups.values(), key=lambda group: group[key], reverse=True)
@@ -0,0 +1,67 @@
+import logging
+import threading
+from app import crud, archive
+from app.config import get_settings
+from app.db import SessionLocal, engine, run_sqlite_maintenance
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Runs fn(db) every interval seconds on a daemon thread, each time with a fresh session."""
+
+    def __init__(self, name: str, interval: float, fn):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+
+    def run_once(self):
+        db = SessionLocal()
+        try:
+            result = self.fn(db)
+            logger.info("Job %s finished: %s", self.name, result)
+            return result
+        except Exception:
+            logger.exception("Job %s failed", self.name)
+        finally:
+            db.close()
+
+    def _loop(self, stop: threading.Event):
+        while not stop.wait(self.interval):
+            self.run_once()
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = []
+        self._stop = threading.Event()
+        self._threads = []
+
+    def add_job(self, name: str, interval: float, fn):
+        self.jobs.append(PeriodicJob(name, interval, fn))
+
+    def start(self):
+        self._stop.clear()
+        for job in self.jobs:
+            thread = threading.Thread(target=job._loop, args=(self._stop,), name=f"job-{job.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+
+def build_scheduler():
+    settings = get_settings()
+    scheduler = Scheduler()
+    scheduler.add_job("expire_posts", settings.EXPIRY_SWEEP_INTERVAL_SECONDS, crud.expire_posts)
+    scheduler.add_job("archive_posts", settings.ARCHIVE_INTERVAL_SECONDS, archive.archive_posts)
+    if engine.dialect.name == "sqlite" and settings.SQLITE_TUNED:
+        scheduler.add_job("sqlite_maintenance", settings.SQLITE_MAINTENANCE_INTERVAL_SECONDS, run_sqlite_maintenance)
+    return scheduler
+
+
+scheduler = build_scheduler()
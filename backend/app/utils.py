@@ -1,18 +1,21 @@
 from passlib.context import CryptContext
 import jwt
 from datetime import datetime, timedelta
+from typing import Optional
 from app.config import get_settings
-from fastapi import Depends, HTTPException, status, Request
+from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.db import get_db
 from app import crud
+from app import schemas
 from app.schemas import TokenData
 settings = get_settings()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 
 def verify_password(plain_password, hashed_password):
@@ -31,9 +34,7 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db), request: Request = None):
-    if request:
-        print("[DEBUG] Incoming request headers:", dict(request.headers))
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -50,4 +51,20 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user = crud.get_user_by_username(db, username=token_data.username)
     if user is None:
         raise credentials_exception
-    return user 
\ No newline at end of file
+    return user
+
+
+def get_current_user_optional(token: Optional[str] = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)):
+    """Like get_current_user, but returns None for anonymous or invalid credentials."""
+    if not token:
+        return None
+    try:
+        return get_current_user(token=token, db=db)
+    except HTTPException:
+        return None
+
+
+def get_admin_user(current_user: schemas.UserRead = Depends(get_current_user)):
+    if current_user.username not in settings.admin_usernames:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
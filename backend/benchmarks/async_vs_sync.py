@@ -0,0 +1,155 @@
+"""Compare the sync (threadpool) and async database paths under concurrent load.
+
+    python -m benchmarks.async_vs_sync --concurrency 50 --operations 2000
+
+Seeds a scratch SQLite database (or uses --database-url), then runs the same
+workload, loading a post for PostRead and updating it for a share of the
+operations, two ways:
+
+* sync: app.crud on a Session in the threadpool, as the sync routes do
+* async: app.async_crud on an AsyncSession on the event loop
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="database to seed and benchmark (default: a temporary SQLite file)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="share of operations that also update the post")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    return parser.parse_args()
+
+
+def seed(engine, users: int, posts: int):
+    from sqlalchemy import insert
+    from app.db import Base
+    from app.models import user, post, follow, interaction, message, archive  # noqa: F401
+    from app.utils import get_password_hash
+
+    Base.metadata.create_all(bind=engine)
+    password = get_password_hash("benchmark")
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(user.User), [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": password}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(insert(post.Post), [
+            {
+                "id": i, "title": f"Post {i}", "description": "Free stuff", "category": "new",
+                "latitude": 47.6 + random.uniform(-0.1, 0.1), "longitude": -122.3 + random.uniform(-0.1, 0.1),
+                "photo_url": "uploads/posts/x.jpg", "owner_id": random.randint(1, users),
+                "created_at": now, "updated_at": now, "is_gone": False,
+            }
+            for i in range(1, posts + 1)
+        ])
+        conn.execute(insert(interaction.Like), [
+            {"post_id": random.randint(1, posts), "user_id": i} for i in range(1, users + 1)
+        ])
+
+
+def summarize(mode: str, latencies, elapsed: float):
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "mode": mode,
+        "operations": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ops_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+    }
+
+
+async def run_load(operation, operations: int, concurrency: int):
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(operations):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            await operation(i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+async def main():
+    args = parse_args()
+    if not args.database_url:
+        args.database_url = f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+    # Settings are read at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["ENABLE_BACKGROUND_JOBS"] = "false"
+
+    from starlette.concurrency import run_in_threadpool
+    from app import crud, async_crud, schemas
+    from app.db import engine, SessionLocal, get_async_sessionmaker
+    from app.loaders import UserLoader
+
+    seed(engine, args.users, args.posts)
+    plan = [(random.randint(1, args.posts), random.random() < args.write_ratio) for _ in range(args.operations)]
+
+    def sync_operation(i):
+        post_id, write = plan[i]
+        db = SessionLocal()
+        try:
+            post = crud.get_post(db, post_id)
+            if write:
+                post = crud.update_post(db, post_id, schemas.PostUpdate(title=f"Post {post_id} ({i})"))
+            UserLoader(db).prime_posts([post])
+            schemas.PostRead.model_validate(post, from_attributes=True)
+        finally:
+            db.close()
+
+    async def threadpool_operation(i):
+        await run_in_threadpool(sync_operation, i)
+
+    session_factory = get_async_sessionmaker()
+
+    async def async_operation(i):
+        post_id, write = plan[i]
+        async with session_factory() as db:
+            post = await async_crud.get_post(db, post_id)
+            if write:
+                post = await async_crud.update_post(db, post_id, schemas.PostUpdate(title=f"Post {post_id} ({i})"))
+            schemas.PostRead.model_validate(post, from_attributes=True)
+
+    results = []
+    for mode, operation in (("sync", threadpool_operation), ("async", async_operation)):
+        await operation(0)  # warm up connections
+        latencies, elapsed = await run_load(operation, args.operations, args.concurrency)
+        results.append(summarize(mode, latencies, elapsed))
+
+    report = {
+        "database": engine.dialect.name,
+        "concurrency": args.concurrency,
+        "write_ratio": args.write_ratio,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
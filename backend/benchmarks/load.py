@@ -0,0 +1,201 @@
+"""In-process load test of the main read and write endpoints.
+
+    python -m benchmarks.load --scale 0.1 --concurrency 32 --duration 30 --output results.json
+    python -m benchmarks.load --database-url sqlite:///./benchmark.db --baseline baseline.json
+
+Seeds the database with benchmarks.seed if it is empty, then drives the
+FastAPI app through httpx's ASGI transport with concurrent async clients,
+each request authenticated as a random seeded user. Reports p50/p95/p99
+latency, throughput and SQL queries per request for each scenario, saves
+them as JSON, and compares against a previous run with --baseline (exit
+status 1 if a scenario regressed beyond --max-regression).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime
+
+from benchmarks import seed as seeder
+
+
+def feed_request(rng, users, posts):
+    _, _, latitude, longitude = rng.choice(seeder.METROS)
+    return "GET", "/posts/", {
+        "latitude": rng.gauss(latitude, seeder.METRO_SPREAD_DEGREES),
+        "longitude": rng.gauss(longitude, seeder.METRO_SPREAD_DEGREES),
+        "radius": 10,
+    }
+
+
+# name: (weight, request builder); builders get (rng, users, posts) and return (method, path, params)
+SCENARIOS = {
+    "feed": (35, feed_request),
+    "search": (15, lambda rng, users, posts: ("GET", "/posts/search", {"q": rng.choice(seeder.SEARCH_TERMS)})),
+    "profile": (20, lambda rng, users, posts: ("GET", f"/users/{rng.randint(1, users)}", None)),
+    "like": (15, lambda rng, users, posts: (rng.choice(["PUT", "DELETE"]), f"/posts/{rng.randint(1, posts)}/like", None)),
+    "notifications": (15, lambda rng, users, posts: ("GET", "/users/notifications/", None)),
+}
+
+_query_counter: ContextVar = ContextVar("benchmark_query_counter", default=None)
+
+
+def count_queries(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./benchmark.db")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run the load")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unrecorded load first")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed relative increase in p95 or queries per request over the baseline (default 0.2)")
+    seeder.add_arguments(parser)
+    return parser.parse_args()
+
+
+def percentile_ms(quantiles, p):
+    return round(quantiles[p - 1] * 1000, 2)
+
+
+def summarize(samples, elapsed: float):
+    latencies = sorted(latency for latency, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    # quantiles() needs two points
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, status in samples if status >= 400),
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "p50_ms": percentile_ms(quantiles, 50),
+        "p95_ms": percentile_ms(quantiles, 95),
+        "p99_ms": percentile_ms(quantiles, 99),
+        "queries_per_request": round(statistics.mean(queries), 2),
+        "max_queries": max(queries),
+    }
+
+
+def compare(results, baseline, max_regression: float):
+    """Print per-scenario changes against the baseline; return the scenarios that regressed."""
+    regressed = []
+    print(f"\n{'scenario':<14}{'p95 ms':>18}{'queries/req':>18}")
+    for name, current in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        change = (current["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0
+        more_queries = current["queries_per_request"] > before["queries_per_request"] * (1 + max_regression)
+        flag = ""
+        if change > max_regression or more_queries:
+            regressed.append(name)
+            flag = "  REGRESSED"
+        print(
+            f"{name:<14}{before['p95_ms']:>8} -> {current['p95_ms']:<8}"
+            f"{before['queries_per_request']:>8} -> {current['queries_per_request']:<8}{change:+.0%}{flag}"
+        )
+    return regressed
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    import httpx
+    from sqlalchemy import event, func, select
+    from sqlalchemy.engine import Engine
+    from app.db import engine
+    from app.main import app
+    from app.models.user import User
+    from app.models.post import Post
+    from app.utils import create_access_token
+
+    with engine.connect() as conn:
+        users = conn.execute(select(func.count()).select_from(User)).scalar()
+    if not users:
+        seeder.seed_from_args(engine, args)
+    with engine.connect() as conn:
+        users = conn.execute(select(func.count()).select_from(User)).scalar()
+        posts = conn.execute(select(func.count()).select_from(Post)).scalar()
+
+    # Counts every statement of every engine (sync, async and replicas) per request
+    event.listen(Engine, "before_cursor_execute", count_queries)
+
+    scenarios = {name: SCENARIOS[name] for name in args.scenarios.split(",")}
+    names, weights = list(scenarios), [weight for weight, _ in scenarios.values()]
+    tokens = {}
+    samples = {name: [] for name in scenarios}
+    rng = random.Random(args.random_seed)
+
+    async def worker(client, deadline, record):
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            user_id = rng.randint(1, users)
+            if user_id not in tokens:
+                tokens[user_id] = create_access_token({"sub": f"user{user_id}"})
+            method, path, params = scenarios[name][1](rng, users, posts)
+            counter = [0]
+            reset = _query_counter.set(counter)
+            start = time.perf_counter()
+            response = await client.request(method, path, params=params,
+                                            headers={"Authorization": f"Bearer {tokens[user_id]}"})
+            latency = time.perf_counter() - start
+            _query_counter.reset(reset)
+            if record:
+                samples[name].append((latency, counter[0], response.status_code))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for duration, record in ((args.warmup, False), (args.duration, True)):
+            deadline = time.perf_counter() + duration
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(client, deadline, record) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "database": engine.dialect.name,
+        "dataset": {"users": users, "posts": posts},
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 1),
+        "scenarios": {name: summarize(samples[name], elapsed) for name in scenarios if samples[name]},
+    }
+
+
+def main():
+    args = parse_args()
+    # Settings are read at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["ENABLE_BACKGROUND_JOBS"] = "false"
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(results, json.load(f), args.max_regression)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Synthetic data generator for benchmarks.
+
+    python -m benchmarks.seed --database-url sqlite:///./benchmark.db --scale 0.1
+
+Bulk-inserts users, posts, a follow graph and likes/comments/got-its with
+notifications, at production-like volumes (100k users and 1M posts at scale
+1). Users and posts cluster around a handful of metros. Popularity is
+Zipf-distributed: a few users attract most follows and a few posts most
+interactions, which is what makes profile, feed and notification queries
+expensive in practice. Ids are assigned sequentially from 1, so load tests
+can pick users and posts without querying.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert, func, select
+
+METROS = [
+    ("Seattle", "WA", 47.61, -122.33),
+    ("Portland", "OR", 45.52, -122.68),
+    ("San Francisco", "CA", 37.77, -122.42),
+    ("Los Angeles", "CA", 34.05, -118.24),
+    ("Austin", "TX", 30.27, -97.74),
+    ("Chicago", "IL", 41.88, -87.63),
+    ("New York", "NY", 40.71, -74.01),
+    ("Boston", "MA", 42.36, -71.06),
+]
+METRO_WEIGHTS = np.array([3, 1, 2, 4, 1, 3, 6, 2]) / 22
+METRO_SPREAD_DEGREES = 0.15
+
+CATEGORIES = ["leftovers", "new", "restaurant", "home_made"]
+CATEGORY_WEIGHTS = [0.4, 0.2, 0.25, 0.15]
+ADJECTIVES = ["fresh", "homemade", "spicy", "vegan", "leftover", "organic", "frozen", "sweet", "warm", "extra"]
+FOODS = ["soup", "bread", "pizza", "curry", "salad", "cookies", "pasta", "rice", "tacos", "bagels", "apples", "cake"]
+# Shared with the load test so searches hit real titles
+SEARCH_TERMS = ADJECTIVES + FOODS
+
+POPULARITY_EXPONENT = 1.1
+HISTORY_DAYS = 30
+
+
+def zipf_choice(rng, n: int, size: int, exponent: float = POPULARITY_EXPONENT):
+    """Draw size ids in 1..n where the id at popularity rank r has weight 1/r**exponent."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    # Spread popular ids over the whole range rather than the lowest ids
+    ranked_ids = rng.permutation(n) + 1
+    return ranked_ids[rng.choice(n, size=size, p=weights / weights.sum())]
+
+
+def unique_pairs(a, b, drop_self: bool = False):
+    """Drop duplicate (a, b) pairs, and pairs with a == b if drop_self."""
+    if drop_self:
+        keep = a != b
+        a, b = a[keep], b[keep]
+    pairs = np.unique(np.stack([a, b], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+class Seeder:
+    def __init__(self, engine, rng, batch_size: int = 10_000):
+        self.engine = engine
+        self.rng = rng
+        self.batch_size = batch_size
+        self.now = datetime.utcnow()
+
+    def insert(self, table, columns: dict):
+        """Insert column arrays in batches of executemany rows."""
+        names = list(columns)
+        values = [column.tolist() if isinstance(column, np.ndarray) else column for column in columns.values()]
+        total = len(values[0])
+        start = time.perf_counter()
+        with self.engine.begin() as conn:
+            for offset in range(0, total, self.batch_size):
+                rows = [dict(zip(names, row)) for row in zip(*(v[offset:offset + self.batch_size] for v in values))]
+                conn.execute(insert(table), rows)
+        print(f"  {table.name}: {total} rows in {time.perf_counter() - start:.1f}s")
+
+    def timestamps(self, size: int, max_age_days: float = HISTORY_DAYS):
+        ages = self.rng.uniform(0, max_age_days * 86400, size)
+        return [self.now - timedelta(seconds=age) for age in ages.tolist()]
+
+    def locations(self, size: int):
+        metros = self.rng.choice(len(METROS), size=size, p=METRO_WEIGHTS)
+        lat = np.array([m[2] for m in METROS])[metros] + self.rng.normal(0, METRO_SPREAD_DEGREES, size)
+        lng = np.array([m[3] for m in METROS])[metros] + self.rng.normal(0, METRO_SPREAD_DEGREES, size)
+        return metros, lat.round(6), lng.round(6)
+
+    def users(self, n: int):
+        from app.models.user import User
+        from app.utils import get_password_hash
+
+        _, lat, lng = self.locations(n)
+        password = get_password_hash("benchmark")
+        ids = np.arange(1, n + 1)
+        self.insert(User.__table__, {
+            "id": ids,
+            "username": [f"user{i}" for i in ids.tolist()],
+            "email": [f"user{i}@example.com" for i in ids.tolist()],
+            "hashed_password": [password] * n,
+            "display_name": [f"User {i}" for i in ids.tolist()],
+            "latitude": lat,
+            "longitude": lng,
+        })
+
+    def posts(self, n: int, users: int):
+        from app.models.post import Post, compute_expires_at
+
+        metros, lat, lng = self.locations(n)
+        categories = self.rng.choice(CATEGORIES, size=n, p=CATEGORY_WEIGHTS).tolist()
+        created = self.timestamps(n)
+        expires = [compute_expires_at(category, at) for category, at in zip(categories, created)]
+        adjectives = self.rng.choice(ADJECTIVES, size=n).tolist()
+        foods = self.rng.choice(FOODS, size=n).tolist()
+        self.insert(Post.__table__, {
+            "id": np.arange(1, n + 1),
+            "title": [f"Free {adjective} {food}" for adjective, food in zip(adjectives, foods)],
+            "description": [f"Some {food} to give away, come pick it up" for food in foods],
+            "category": categories,
+            "latitude": lat,
+            "longitude": lng,
+            "address": [f"{METROS[m][0]}, {METROS[m][1]}" for m in metros.tolist()],
+            "city": [METROS[m][0] for m in metros.tolist()],
+            "state": [METROS[m][1] for m in metros.tolist()],
+            "photo_url": ["uploads/posts/benchmark.jpg"] * n,
+            # Active posters post more
+            "owner_id": zipf_choice(self.rng, users, n, exponent=0.8),
+            "created_at": created,
+            "updated_at": created,
+            "is_gone": [expires_at is not None and expires_at < self.now for expires_at in expires],
+            "expires_at": expires,
+        })
+
+    def follows(self, users: int, per_user: float):
+        from app.models.follow import Follow
+
+        size = int(users * per_user)
+        followers, following = unique_pairs(
+            self.rng.integers(1, users + 1, size),
+            zipf_choice(self.rng, users, size),
+            drop_self=True,
+        )
+        self.insert(Follow.__table__, {
+            "follower_id": followers,
+            "following_id": following,
+            "created_at": self.timestamps(len(followers)),
+        })
+
+    def interactions(self, users: int, posts: int, owners, likes_per_post: float, comments_per_post: float,
+                     got_its_per_post: float):
+        from app.models.interaction import Like, Comment, GotIt, Notification, NotificationType
+
+        notifications = {"user_id": [], "post_id": [], "actor_id": [], "type": [], "message": [], "created_at": []}
+
+        def notify(post_ids, actor_ids, type_, message, created):
+            notifications["user_id"].extend(owners[post_ids - 1].tolist())
+            notifications["post_id"].extend(post_ids.tolist())
+            notifications["actor_id"].extend(actor_ids.tolist())
+            notifications["type"].extend([type_] * len(post_ids))
+            notifications["message"].extend([message] * len(post_ids))
+            notifications["created_at"].extend(created)
+
+        size = int(posts * likes_per_post)
+        like_users, like_posts = unique_pairs(
+            self.rng.integers(1, users + 1, size),
+            zipf_choice(self.rng, posts, size),
+        )
+        created = self.timestamps(len(like_users))
+        self.insert(Like.__table__, {"post_id": like_posts, "user_id": like_users, "created_at": created})
+        notify(like_posts, like_users, NotificationType.LIKE, "Someone liked your post", created)
+
+        size = int(posts * comments_per_post)
+        comment_posts = zipf_choice(self.rng, posts, size)
+        comment_users = self.rng.integers(1, users + 1, size)
+        created = self.timestamps(size)
+        self.insert(Comment.__table__, {
+            "content": ["Is this still available?"] * size,
+            "post_id": comment_posts,
+            "user_id": comment_users,
+            "created_at": created,
+        })
+        notify(comment_posts, comment_users, NotificationType.COMMENT, "Someone commented on your post", created)
+
+        size = int(posts * got_its_per_post)
+        got_it_users, got_it_posts = unique_pairs(
+            self.rng.integers(1, users + 1, size),
+            zipf_choice(self.rng, posts, size),
+        )
+        created = self.timestamps(len(got_it_users))
+        self.insert(GotIt.__table__, {
+            "post_id": got_it_posts,
+            "user_id": got_it_users,
+            "giver_id": owners[got_it_posts - 1],
+            "created_at": created,
+        })
+        notify(got_it_posts, got_it_users, NotificationType.GOT_IT, "Someone got your item", created)
+
+        notifications["is_read"] = (self.rng.random(len(notifications["user_id"])) < 0.7).tolist()
+        self.insert(Notification.__table__, notifications)
+
+
+def seed(engine, users: int = 100_000, posts: int = 1_000_000, follows_per_user: float = 20,
+         likes_per_post: float = 3, comments_per_post: float = 0.5, got_its_per_post: float = 0.3,
+         batch_size: int = 10_000, random_seed: int = 42):
+    from app.bulk import reset_sequences
+    from app.db import Base
+    from app.models import user, post, follow, interaction, message, archive  # noqa: F401
+    from app.models.post import Post
+
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(user.User)).scalar():
+            raise ValueError("Database already has users; seed an empty database")
+
+    print(f"Seeding {users} users and {posts} posts")
+    start = time.perf_counter()
+    seeder = Seeder(engine, np.random.default_rng(random_seed), batch_size=batch_size)
+    seeder.users(users)
+    seeder.posts(posts, users)
+    seeder.follows(users, follows_per_user)
+    with engine.connect() as conn:
+        owners = np.array(conn.execute(select(Post.owner_id).order_by(Post.id)).scalars().all())
+    seeder.interactions(users, posts, owners, likes_per_post, comments_per_post, got_its_per_post)
+    reset_sequences(engine)
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+
+def add_arguments(parser):
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for --users and --posts")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--follows-per-user", type=float, default=20)
+    parser.add_argument("--likes-per-post", type=float, default=3)
+    parser.add_argument("--comments-per-post", type=float, default=0.5)
+    parser.add_argument("--got-its-per-post", type=float, default=0.3)
+    parser.add_argument("--random-seed", type=int, default=42)
+
+
+def seed_from_args(engine, args):
+    seed(
+        engine,
+        users=max(2, int(args.users * args.scale)),
+        posts=max(1, int(args.posts * args.scale)),
+        follows_per_user=args.follows_per_user,
+        likes_per_post=args.likes_per_post,
+        comments_per_post=args.comments_per_post,
+        got_its_per_post=args.got_its_per_post,
+        random_seed=args.random_seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./benchmark.db")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from app.db import create_db_engine
+    engine = create_db_engine(args.database_url)
+    seed_from_args(engine, args)
+
+
+if __name__ == "__main__":
+    main()
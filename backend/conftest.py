@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# test_backend.py exercises a running server over HTTP; run it directly with
+# `python test_backend.py` rather than collecting it with the unit tests.
+collect_ignore = ["test_backend.py"]
+
+# Settings are read once, on first import of the app. Point the app's own
+# engine at a scratch database so route tests never touch ./freebies.db.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='freebies-test-')}/app.db")
+os.environ.setdefault("ENABLE_BACKGROUND_JOBS", "false")
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+os.environ.setdefault("ADMIN_USERNAMES", "admin")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,41 @@
+"""add sync receipts
+
+Revision ID: 3b9c1e7a4d20
+Revises: ed427696b80e
+Create Date: 2026-10-19 10:12:44.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9c1e7a4d20'
+down_revision: Union[str, None] = 'ed427696b80e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sync_receipts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('idempotency_key', sa.String(), nullable=True),
+    sa.Column('action', sa.Enum('LIKE', 'UNLIKE', 'GOT_IT', 'UNDO_GOT_IT', 'HIDE', 'UNHIDE', 'FOLLOW', 'UNFOLLOW', name='syncaction'), nullable=True),
+    sa.Column('target_id', sa.Integer(), nullable=True),
+    sa.Column('state', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'idempotency_key', name='unique_sync_receipt')
+    )
+    op.create_index(op.f('ix_sync_receipts_id'), 'sync_receipts', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_sync_receipts_id'), table_name='sync_receipts')
+    op.drop_table('sync_receipts')
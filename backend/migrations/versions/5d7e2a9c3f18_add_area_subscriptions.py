@@ -0,0 +1,53 @@
+"""add area subscriptions
+
+Revision ID: 5d7e2a9c3f18
+Revises: c41a7e9d5b02
+Create Date: 2026-10-19 14:21:08.512337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7e2a9c3f18'
+down_revision: Union[str, None] = 'c41a7e9d5b02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('area_subscriptions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('latitude', sa.Float(), nullable=True),
+    sa.Column('longitude', sa.Float(), nullable=True),
+    sa.Column('radius_km', sa.Float(), nullable=True),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_area_subscriptions_id'), 'area_subscriptions', ['id'], unique=False)
+    op.create_index(op.f('ix_area_subscriptions_user_id'), 'area_subscriptions', ['user_id'], unique=False)
+    op.create_table('subscription_cells',
+    sa.Column('cell_x', sa.Integer(), nullable=False),
+    sa.Column('cell_y', sa.Integer(), nullable=False),
+    sa.Column('subscription_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['subscription_id'], ['area_subscriptions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('cell_x', 'cell_y', 'subscription_id')
+    )
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TYPE notificationtype ADD VALUE IF NOT EXISTS 'NEARBY'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Postgres can't drop a value from an enum type, so NEARBY is left in place
+    op.drop_table('subscription_cells')
+    op.drop_index(op.f('ix_area_subscriptions_user_id'), table_name='area_subscriptions')
+    op.drop_index(op.f('ix_area_subscriptions_id'), table_name='area_subscriptions')
+    op.drop_table('area_subscriptions')
@@ -0,0 +1,95 @@
+"""add city and state to post
+
+Revision ID: 8f2d4c6b1a93
+Revises: 3b9c1e7a4d20
+Create Date: 2026-10-19 11:40:02.518734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2d4c6b1a93'
+down_revision: Union[str, None] = '3b9c1e7a4d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# A copy of app.models.post.parse_city_state as of this revision, so later
+# changes to the app don't change what this migration writes
+STATE_ABBREVIATIONS = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'california': 'CA', 'colorado': 'CO',
+    'connecticut': 'CT', 'delaware': 'DE', 'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID',
+    'illinois': 'IL', 'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS', 'kentucky': 'KY', 'louisiana': 'LA',
+    'maine': 'ME', 'maryland': 'MD', 'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN',
+    'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV',
+    'new hampshire': 'NH', 'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY', 'north carolina': 'NC',
+    'north dakota': 'ND', 'ohio': 'OH', 'oklahoma': 'OK', 'oregon': 'OR', 'pennsylvania': 'PA',
+    'rhode island': 'RI', 'south carolina': 'SC', 'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX',
+    'utah': 'UT', 'vermont': 'VT', 'virginia': 'VA', 'washington': 'WA', 'west virginia': 'WV',
+    'wisconsin': 'WI', 'wyoming': 'WY'
+}
+
+
+def parse_city_state(address):
+    """Extract (city, state abbreviation) from a free-form address. Either may be None."""
+    if not address:
+        return None, None
+    parts = [p.strip() for p in address.split(',')]
+    # Remove empty, numeric (zip), and irrelevant parts
+    filtered = [p for p in parts if p and not p.isdigit() and 'county' not in p.lower() and 'united states' not in p.lower()]
+    for i in range(len(filtered)-1):
+        part = filtered[i]
+        next_part = filtered[i+1]
+        # Heuristic: city is not a state abbreviation, state is 2-letter or full state name
+        if len(next_part) == 2 and next_part.isalpha():
+            return part, next_part.upper()
+        # Or, if state is a full name (e.g., 'Washington')
+        state_lower = next_part.lower()
+        if state_lower in STATE_ABBREVIATIONS:
+            return part, STATE_ABBREVIATIONS[state_lower]
+    # Fallback: first non-numeric, non-county part
+    for part in filtered:
+        if not part.isdigit():
+            return part, None
+    return address.strip(), None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('city', sa.String(), nullable=True))
+    op.add_column('posts', sa.Column('state', sa.String(), nullable=True))
+    op.create_index(op.f('ix_posts_state'), 'posts', ['state'], unique=False)
+    op.create_index('ix_posts_city_lower', 'posts', [sa.text('lower(city)')], unique=False)
+
+    # Backfill existing rows from their address
+    bind = op.get_bind()
+    posts = sa.table('posts', sa.column('id', sa.Integer), sa.column('city', sa.String), sa.column('state', sa.String))
+    update = posts.update().where(posts.c.id == sa.bindparam('post_id')).values(
+        city=sa.bindparam('new_city'), state=sa.bindparam('new_state')
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text("SELECT id, address FROM posts WHERE id > :last_id AND address IS NOT NULL ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        params = []
+        for post_id, address in rows:
+            city, state = parse_city_state(address)
+            params.append({"post_id": post_id, "new_city": city, "new_state": state})
+        bind.execute(update, params)
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_city_lower', table_name='posts')
+    op.drop_index(op.f('ix_posts_state'), table_name='posts')
+    op.drop_column('posts', 'state')
+    op.drop_column('posts', 'city')
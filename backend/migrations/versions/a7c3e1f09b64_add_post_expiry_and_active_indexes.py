@@ -0,0 +1,82 @@
+"""add post expiry and active post indexes
+
+Revision ID: a7c3e1f09b64
+Revises: 5d7e2a9c3f18
+Create Date: 2026-10-19 15:02:47.330912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.post import compute_expires_at
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e1f09b64'
+down_revision: Union[str, None] = '5d7e2a9c3f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+ACTIVE_SQLITE = sa.text('is_gone = 0')
+ACTIVE_POSTGRESQL = sa.text('is_gone = false')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # is_gone was added to the model without a migration, so databases built
+    # from these migrations alone don't have it yet
+    if 'is_gone' not in {column['name'] for column in sa.inspect(op.get_bind()).get_columns('posts')}:
+        with op.batch_alter_table('posts') as batch_op:
+            batch_op.add_column(sa.Column('is_gone', sa.Boolean(), nullable=True))
+    op.add_column('posts', sa.Column('expires_at', sa.DateTime(), nullable=True))
+
+    posts = sa.table(
+        'posts',
+        sa.column('id', sa.Integer),
+        sa.column('category', sa.String),
+        sa.column('created_at', sa.DateTime),
+        sa.column('is_gone', sa.Boolean),
+        sa.column('expires_at', sa.DateTime)
+    )
+    bind = op.get_bind()
+    # Rows from before is_gone had a default would otherwise fall outside the active indexes
+    bind.execute(posts.update().where(posts.c.is_gone.is_(None)).values(is_gone=False))
+
+    # Backfill expiry for active posts; already-stale ones are picked up by the next sweep
+    update = posts.update().where(posts.c.id == sa.bindparam('post_id')).values(expires_at=sa.bindparam('new_expires_at'))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(posts.c.id, posts.c.category, posts.c.created_at)
+            .where(posts.c.id > last_id, posts.c.is_gone == False, posts.c.created_at.is_not(None))
+            .order_by(posts.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        params = [
+            {"post_id": post_id, "new_expires_at": compute_expires_at(category, created_at)}
+            for post_id, category, created_at in rows
+        ]
+        bind.execute(update, params)
+        last_id = rows[-1][0]
+
+    op.drop_index('ix_posts_lat_lng', table_name='posts')
+    op.create_index('ix_posts_active_created_at', 'posts', ['created_at'], unique=False,
+                    sqlite_where=ACTIVE_SQLITE, postgresql_where=ACTIVE_POSTGRESQL)
+    op.create_index('ix_posts_active_lat_lng', 'posts', ['latitude', 'longitude'], unique=False,
+                    sqlite_where=ACTIVE_SQLITE, postgresql_where=ACTIVE_POSTGRESQL)
+    op.create_index('ix_posts_active_expires_at', 'posts', ['expires_at'], unique=False,
+                    sqlite_where=ACTIVE_SQLITE, postgresql_where=ACTIVE_POSTGRESQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_active_expires_at', table_name='posts')
+    op.drop_index('ix_posts_active_lat_lng', table_name='posts')
+    op.drop_index('ix_posts_active_created_at', table_name='posts')
+    op.create_index('ix_posts_lat_lng', 'posts', ['latitude', 'longitude'], unique=False)
+    op.drop_column('posts', 'expires_at')
@@ -0,0 +1,69 @@
+"""never reuse ids of archivable rows on sqlite
+
+Revision ID: b4f9d2e7c615
+Revises: e2b8f4a61c37
+Create Date: 2026-10-19 21:14:06.204517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4f9d2e7c615'
+down_revision: Union[str, None] = 'e2b8f4a61c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Archived rows keep their original ids, so these tables must never hand an
+# archived id out again. Postgres sequences never do; SQLite reuses the
+# highest id once that row is deleted unless the table uses AUTOINCREMENT.
+ARCHIVED_TABLES = {
+    'posts': 'archived_posts',
+    'comments': 'archived_comments',
+    'likes': 'archived_likes',
+    'got_it': 'archived_got_it',
+}
+
+
+def _recreate(table: str, autoincrement: bool):
+    """Rebuild a SQLite table, keeping the expression indexes batch mode can't reflect."""
+    bind = op.get_bind()
+    indexes = bind.execute(
+        sa.text("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"),
+        {"table": table}
+    ).fetchall()
+    with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+    remaining = {row[0] for row in bind.execute(
+        sa.text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"), {"table": table}
+    )}
+    for name, sql in indexes:
+        if name not in remaining:
+            bind.execute(sa.text(sql))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    for table, archive_table in ARCHIVED_TABLES.items():
+        _recreate(table, autoincrement=True)
+        # Start past every id already handed out, including archived ones
+        # that were deleted from the live table
+        last_id = bind.execute(sa.text(
+            f"SELECT max(coalesce((SELECT max(id) FROM {table}), 0), coalesce((SELECT max(id) FROM {archive_table}), 0))"
+        )).scalar()
+        bind.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table})
+        bind.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {"name": table, "seq": last_id})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in ARCHIVED_TABLES:
+        _recreate(table, autoincrement=False)
@@ -0,0 +1,28 @@
+"""add post lat/lng index
+
+Revision ID: c41a7e9d5b02
+Revises: 8f2d4c6b1a93
+Create Date: 2026-10-19 13:05:27.904116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41a7e9d5b02'
+down_revision: Union[str, None] = '8f2d4c6b1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_posts_lat_lng', 'posts', ['latitude', 'longitude'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_lat_lng', table_name='posts')
@@ -1 +1,148 @@
- 
\ No newline at end of file
+"""Command line tools for the Freebies backend.
+
+    python run.py import users users.csv
+    python run.py import posts posts.ndjson.gz --batch-size 10000
+    python run.py import all ./partner_export/
+    python run.py export posts --format csv -o posts.csv.gz
+    python run.py export user alice -o alice.ndjson
+    python run.py slow-queries --top 10 --sort max
+
+``import all`` loads users, posts, follows, likes, comments and got_it files
+(.csv, .ndjson or .jsonl, optionally gzipped) from a directory in dependency
+order. Exports stream rows in batches, so memory use doesn't grow with the
+table size. ``slow-queries`` summarizes SLOW_QUERY_LOG by normalized statement.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from datetime import datetime
+
+
+def import_command(args):
+    from sqlalchemy.exc import IntegrityError
+    from app import bulk
+    from app.config import get_settings
+    from app.db import create_db_engine
+
+    engine = create_db_engine(get_settings().DATABASE_URL)
+    try:
+        bulk.check_schema(engine)
+    except ValueError as e:
+        sys.exit(f"Can't import: {e}")
+    importer = bulk.Importer(engine, batch_size=args.batch_size, hash_workers=args.hash_workers)
+
+    if args.kind == "all":
+        if len(args.paths) != 1 or not os.path.isdir(args.paths[0]):
+            sys.exit("import all takes one dataset directory")
+        files = []
+        for kind in bulk.IMPORT_ORDER:
+            matches = sorted(glob.glob(os.path.join(args.paths[0], f"{kind}.*")))
+            files.extend((kind, path) for path in matches)
+    else:
+        files = [(args.kind, path) for path in args.paths]
+
+    for kind, path in files:
+        start = time.perf_counter()
+        try:
+            count = importer.import_file(kind, path, args.format)
+        except KeyError as e:
+            sys.exit(f"{path}: missing field {e}")
+        except ValueError as e:
+            sys.exit(f"{path}: {e}")
+        except IntegrityError as e:
+            # Earlier batches of the file stay committed
+            sys.exit(f"{path}: {e.orig} (batch rolled back)")
+        print(f"{path}: {count} {kind} records in {time.perf_counter() - start:.1f}s")
+    importer.finalize()
+
+
+def export_command(args):
+    from app import export
+    from app.db import SessionLocal
+    from app.models.user import User
+
+    gzip = args.gzip or (args.output or "").endswith(".gz")
+    if args.kind == "user":
+        if not args.user:
+            sys.exit("export user needs a user id or username")
+        db = SessionLocal()
+        user = db.query(User).filter(
+            User.id == int(args.user) if args.user.isdigit() else User.username == args.user
+        ).first()
+        db.close()
+        if user is None:
+            sys.exit(f"No user {args.user}")
+        columns, batches, format = None, export.user_export(user.id), "ndjson"
+    else:
+        columns, batches = export.table_export(args.kind, since=args.since)
+        format = args.format
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in export.encode(columns, batches, format=format, gzip=gzip):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+def slow_queries_command(args):
+    from app import slow_queries
+    from app.config import get_settings
+
+    path = args.log or get_settings().SLOW_QUERY_LOG
+    groups = slow_queries.summarize(slow_queries.read_log(path), sort=args.sort)
+    if not groups:
+        print(f"No slow statements in {path}")
+        return
+    for rank, group in enumerate(groups[:args.top], 1):
+        print(f"#{rank}  {group['count']} calls  total {group['total_ms']:.0f}ms  "
+              f"mean {group['mean_ms']:.1f}ms  max {group['max_ms']:.1f}ms")
+        print(f"    {group['fingerprint'][:args.width]}")
+        for caller in group["callers"]:
+            print(f"    from {caller}")
+        for line in group["plan"] or ():
+            print(f"    plan: {line}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="bulk-import records from CSV or NDJSON files")
+    import_parser.add_argument("kind", choices=["all", "users", "posts", "follows", "likes", "comments", "got_it"])
+    import_parser.add_argument("paths", nargs="+")
+    import_parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the file extension")
+    import_parser.add_argument("--batch-size", type=int, default=5000)
+    import_parser.add_argument("--hash-workers", type=int, help="processes hashing plaintext passwords (default: CPU count)")
+    import_parser.set_defaults(handler=import_command)
+
+    export_parser = commands.add_parser("export", help="stream a table or a user's data as NDJSON or CSV")
+    export_parser.add_argument("kind", choices=["posts", "comments", "likes", "got_it", "user"])
+    export_parser.add_argument("user", nargs="?", help="user id or username, for export user")
+    export_parser.add_argument("-o", "--output", help="file to write (default: stdout); .gz compresses")
+    export_parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson", help="user exports are always NDJSON")
+    export_parser.add_argument("--gzip", action="store_true")
+    export_parser.add_argument("--since", type=datetime.fromisoformat, help="only rows created at or after this time")
+    export_parser.set_defaults(handler=export_command)
+
+    slow_parser = commands.add_parser("slow-queries", help="summarize the slow statement log by normalized statement")
+    slow_parser.add_argument("--log", help="defaults to SLOW_QUERY_LOG; rotated backups are read too")
+    slow_parser.add_argument("--top", type=int, default=20)
+    slow_parser.add_argument("--sort", choices=["total", "count", "max", "mean"], default="total")
+    slow_parser.add_argument("--width", type=int, default=300, help="truncate statements to this many characters")
+    slow_parser.set_defaults(handler=slow_queries_command)
+
+    args = parser.parse_args()
+    if args.database_url:
+        # Settings are read when app modules are first imported
+        os.environ["DATABASE_URL"] = args.database_url
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
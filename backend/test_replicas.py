@@ -0,0 +1,85 @@
+"""Tests for read-replica routing, using two SQLite files as primary and replica."""
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, schemas, replicas
+from app.cache import get_cache
+from app.db import Base, create_db_engine
+from app.models import user, post, follow, interaction, message, archive  # noqa: F401 (register tables)
+from app.replicas import ReplicaRouter, current_subject
+
+
+@pytest.fixture
+def primary(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    Base.metadata.create_all(bind=engine)
+    get_cache().clear()
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def replica_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    engine = create_db_engine(url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    return url
+
+
+def routed_to(session):
+    return session.bind.url.database.rsplit("/", 1)[-1]
+
+
+def test_without_replicas_reads_use_primary(primary):
+    router = ReplicaRouter(primary, [])
+    assert routed_to(router.session_for("alice")) == "primary.db"
+
+
+def test_reads_use_replica(primary, replica_url):
+    router = ReplicaRouter(primary, [replica_url])
+    assert routed_to(router.session_for(None)) == "replica.db"
+    assert routed_to(router.session_for("alice")) == "replica.db"
+
+
+def test_writer_reads_from_primary_after_commit(primary, replica_url):
+    router = ReplicaRouter(primary, [replica_url])
+    reset = current_subject.set("alice")
+    try:
+        db = primary()
+        crud.create_user(db, schemas.UserCreate(username="alice", email="alice@example.com", password="pw"))
+        db.close()
+    finally:
+        current_subject.reset(reset)
+    assert routed_to(router.session_for("alice")) == "primary.db"
+    assert routed_to(router.session_for("bob")) == "replica.db"
+
+
+def test_read_only_commit_is_not_sticky(primary, replica_url):
+    router = ReplicaRouter(primary, [replica_url])
+    reset = current_subject.set("alice")
+    try:
+        db = primary()
+        crud.get_user_by_username(db, "alice")
+        db.commit()
+        db.close()
+    finally:
+        current_subject.reset(reset)
+    assert routed_to(router.session_for("alice")) == "replica.db"
+
+
+def test_unreachable_replica_falls_back_to_primary(primary, replica_url, tmp_path):
+    broken = f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"
+    router = ReplicaRouter(primary, [broken, replica_url], retry_seconds=60)
+    assert {routed_to(router.session_for(None)) for _ in range(4)} == {"replica.db"}
+    assert router.status()[0]["available"] is False
+
+    router = ReplicaRouter(primary, [broken])
+    assert routed_to(router.session_for(None)) == "primary.db"
+
+
+def test_lagging_replica_falls_back_to_primary(primary, replica_url, monkeypatch):
+    monkeypatch.setattr(replicas, "replica_lag_seconds", lambda connection: 60.0)
+    router = ReplicaRouter(primary, [replica_url], max_lag_seconds=10)
+    assert routed_to(router.session_for(None)) == "primary.db"
+    assert router.status()[0]["lag_seconds"] == 60.0
@@ -126,7 +126,7 @@ export async function followUser(userId: number) {
 
 // Unfollow a user
 export async function unfollowUser(userId: number) {
-  return api.post(`/users/${userId}/unfollow`);
+  return api.delete(`/users/${userId}/follow`);
 }
 
 // Get followers of a user